@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub asyncio engine
+Alternative to ThreadedHTTPServer: one event loop owns every socket and reads
+requests under timeouts and size limits, and the regular request handler runs
+on a bounded thread pool. Past the connection or in-flight limits clients get
+a 503 instead of another thread.
+"""
+
+import asyncio
+import concurrent.futures
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+SHED_BODY = b"Server busy, retry shortly.\n"
+
+
+def plain_response(status, reason, body, extra=b''):
+    """A complete HTTP/1.1 response that closes the connection."""
+    return (b'HTTP/1.1 %d %s\r\nContent-Type: text/plain; charset=utf-8\r\n'
+            b'Content-Length: %d\r\n%sConnection: close\r\n\r\n%s') % (status, reason, len(body), extra, body)
+
+
+SHED_RESPONSE = plain_response(503, b'Service Unavailable', SHED_BODY, b'Retry-After: 5\r\n')
+
+
+class TransportWriter:
+    """wfile for a handler on a worker thread: writes go out through the event loop.
+
+    Each write waits for the transport to drain (so a slow client slows its
+    own worker, not memory); a disconnect or a write stuck for longer than
+    `timeout` surfaces as BrokenPipeError, which handlers already expect.
+    """
+
+    def __init__(self, loop, writer, timeout):
+        self.loop = loop
+        self.writer = writer
+        self.timeout = timeout
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write(self, data):
+        if not data:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self.loop)
+        try:
+            future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise BrokenPipeError("write timed out")
+        except ConnectionError as e:
+            raise BrokenPipeError(str(e))
+
+    def flush(self):
+        pass
+
+
+class AsyncServer:
+    """Serves a BaseHTTPRequestHandler subclass from an asyncio event loop.
+
+    The handler gets the already-read request as rfile and a TransportWriter
+    as wfile, with `timeout = None` since the loop enforces the timeouts;
+    its close_connection and requests_served decide whether the connection
+    is kept for the next request. Same serve_forever() / shutdown() /
+    server_close() surface as socketserver servers. reuse_port=True binds
+    with SO_REUSEPORT so several processes can share the port.
+    """
+
+    def __init__(self, server_address, handler_class, workers=16, max_connections=1024, max_inflight=64,
+                 header_timeout=10, body_timeout=30, keepalive_timeout=15, write_timeout=120,
+                 max_header_bytes=64 * 1024, max_body_bytes=1024 * 1024, reuse_port=False):
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.workers = workers
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.write_timeout = write_timeout
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self.reuse_port = reuse_port
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sub-hub')
+        self._loop = None
+        self._stopped = None
+        self.connections = 0
+        self.inflight = 0
+        self.requests = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop serve_forever() (callable from any thread)."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def server_close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        host, port = self.server_address
+        server = await asyncio.start_server(self._client, host or None, port, limit=self.max_header_bytes,
+                                            reuse_port=self.reuse_port or None)
+        self.server_address = server.sockets[0].getsockname()[:2]
+        async with server:
+            await self._stopped.wait()
+
+    async def _client(self, reader, writer):
+        try:
+            await self._connection(reader, writer)
+        except asyncio.CancelledError:
+            pass  # Server shutting down with the connection still open
+
+    async def _connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            self.shed += 1
+            await self._reply_and_close(writer, SHED_RESPONSE)
+            return
+        self.connections += 1
+        peer = writer.get_extra_info('peername')
+        requests_served = 0
+        try:
+            while True:
+                # First request: the whole head within header_timeout; later ones: idle + head within keepalive_timeout
+                timeout = self.header_timeout if requests_served == 0 else self.keepalive_timeout
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    return
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._reply_and_close(writer, plain_response(431, b'Request Header Fields Too Large', b''))
+                    return
+
+                content_length = self._content_length(head)
+                if content_length is None:
+                    await self._reply_and_close(writer, plain_response(400, b'Bad Request', b'Bad Content-Length\n'))
+                    return
+                if content_length > self.max_body_bytes:
+                    await self._reply_and_close(writer, plain_response(413, b'Content Too Large', b''))
+                    return
+                body = b''
+                if content_length:
+                    try:
+                        body = await asyncio.wait_for(reader.readexactly(content_length), self.body_timeout)
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+                        return
+                    except asyncio.IncompleteReadError:
+                        return
+
+                if self.inflight >= self.max_inflight:
+                    self.shed += 1
+                    await self._reply_and_close(writer, SHED_RESPONSE)
+                    return
+                self.inflight += 1
+                self.requests += 1
+                try:
+                    wfile = TransportWriter(self._loop, writer, self.write_timeout)
+                    close, requests_served = await self._loop.run_in_executor(
+                        self._executor, self._handle, head + body, peer, wfile, requests_served)
+                except Exception as e:
+                    print(f"Handler error ({peer}): {e}")
+                    return
+                finally:
+                    self.inflight -= 1
+                if close:
+                    return
+        finally:
+            self.connections -= 1
+            await self._close(writer)
+
+    def _handle(self, raw, peer, wfile, requests_served):
+        """Run one request through the handler on a worker thread; (close, requests_served)."""
+        # Skip BaseRequestHandler.__init__, which would read from a socket
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.server = self
+        handler.request = handler.connection = None
+        handler.client_address = peer
+        handler.timeout = None
+        handler.rfile = io.BytesIO(raw)
+        handler.wfile = wfile
+        handler.requests_served = requests_served
+        handler.handle_one_request()
+        return handler.close_connection, handler.requests_served
+
+    @staticmethod
+    def _content_length(head):
+        """Content-Length of a request head (0 if absent), or None if it's malformed."""
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    return None
+                return length if length >= 0 else None
+        return 0
+
+    async def _reply_and_close(self, writer, response):
+        try:
+            writer.write(response)
+            await asyncio.wait_for(writer.drain(), self.header_timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        await self._close(writer)
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    def stats(self):
+        return {
+            "engine": "asyncio",
+            "workers": self.workers,
+            "connections": self.connections,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
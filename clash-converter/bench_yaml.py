@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YAML 读写基准
+对比纯 Python 与 libyaml 两种模式的 load / dump 耗时，并检查两者输出是否逐字节一致。
+
+用法:
+  python bench_yaml.py                      # 默认跑 ../configs/*.yaml
+  python bench_yaml.py a.yaml b.yaml -n 50 --scale 20
+"""
+
+import os
+import sys
+import copy
+import glob
+import time
+import argparse
+
+import yaml_io
+
+
+def best_of(fn, repeat):
+    """跑 repeat 次取最快一次（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scaled(config, factor):
+    """把 proxies 复制 factor 倍（改名避免重复），模拟大订阅"""
+    config = copy.deepcopy(config)
+    proxies = config.get('proxies') or []
+    # 每份都深拷贝：共享的子字典会被 dump 成锚点
+    config['proxies'] = [dict(copy.deepcopy(p), name=f"{p.get('name')} #{i}") for i in range(factor) for p in proxies]
+    return config
+
+
+def bench(label, text, config, repeat):
+    pure_load = best_of(lambda: yaml_io.load(text, fast=False), repeat)
+    fast_load = best_of(lambda: yaml_io.load(text, fast=True), repeat)
+    pure_dump = best_of(lambda: yaml_io.dump(config, fast=False), repeat)
+    fast_dump = best_of(lambda: yaml_io.dump(config, fast=True), repeat)
+    same = yaml_io.dump(config, fast=False) == yaml_io.dump(config, fast=True)
+    print(f"{label:<32} {len(text.encode('utf-8')):>9} "
+          f"{pure_load * 1000:>9.2f} {fast_load * 1000:>9.2f} "
+          f"{pure_dump * 1000:>9.2f} {fast_dump * 1000:>9.2f}  {'OK' if same else 'DIFF'}")
+    return same
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='YAML load/dump 基准（纯 Python vs libyaml）')
+    parser.add_argument('files', nargs='*', help='YAML 文件（默认 ../configs/*.yaml）')
+    parser.add_argument('-n', '--repeat', type=int, default=20, help='每项重复次数，取最快')
+    parser.add_argument('--scale', type=int, default=10, help='额外测一份 proxies 放大 N 倍的版本（0 不测）')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(script_dir, '..', 'configs', '*.yaml')))
+    if not files:
+        print("没有找到 YAML 文件")
+        sys.exit(1)
+
+    print(f"libyaml: {'可用' if yaml_io.LIBYAML else '不可用（两列都是纯 Python）'}")
+    print(f"{'file':<32} {'bytes':>9} {'load py':>9} {'load C':>9} {'dump py':>9} {'dump C':>9}  same  (ms)")
+    ok = True
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        config = yaml_io.load(text)
+        name = os.path.basename(path)
+        ok &= bench(name, text, config, args.repeat)
+        if args.scale > 1 and isinstance(config, dict) and config.get('proxies'):
+            big = scaled(config, args.scale)
+            ok &= bench(f"{name} x{args.scale}", yaml_io.dump(big), big, max(1, args.repeat // 4))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
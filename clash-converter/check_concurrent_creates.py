@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发创建检查
+在临时配置上启动 Sub Hub 的请求处理器，同时发 N 个 POST /api/subscriptions、/api/nodes、/api/guest-pass，
+确认每个返回成功的创建都真的落进了存储（订阅链接不是 403），三种存储模式各跑一遍。
+
+用法:
+  python check_concurrent_creates.py            # 默认每种模式 20 个并发
+  python check_concurrent_creates.py -n 50
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+import sub_bridge
+from config_store import ConfigStore, SqliteConfigStore
+
+NODE_URL = 'ss://YWVzLTI1Ni1nY206cGFzcw==@1.2.3.4:8388#check'
+
+
+class CheckServer(sub_bridge.ThreadedHTTPServer):
+    request_queue_size = 256  # 所有并发连接同时进来，默认的 5 会被拒
+
+
+def request(base, path, method='GET', data=None):
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    req = urllib.request.Request(base + path, data=body, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError as e:
+        return None, str(e).encode('utf-8')
+
+
+def check(label, store, n):
+    """对一个存储跑一轮并发创建，返回是否全部落盘"""
+    sub_bridge.CONFIG_STORE = store
+    sub_bridge.RENDER_CACHE.clear()
+    node_id = store.snapshot().nodes[0]['id']
+    httpd = CheckServer(('127.0.0.1', 0), sub_bridge.SubBridgeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{httpd.server_address[1]}'
+    try:
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            subs = list(pool.map(lambda i: request(base, '/api/subscriptions', 'POST', {'name': f'check-{i}', 'node_ids': [node_id]}), range(n)))
+            nodes = list(pool.map(lambda i: request(base, '/api/nodes', 'POST', {'url': NODE_URL, 'name': f'check-{i}'}), range(n)))
+            guests = list(pool.map(lambda i: request(base, '/api/guest-pass', 'POST', {'format': 'clash', 'node_ids': [node_id], 'duration_hours': 1}), range(n)))
+        tokens = [json.loads(body)['token'] for status, body in subs if status == 200]
+        guest_tokens = [json.loads(body)['link'].rsplit('/', 1)[1] for status, body in guests if status == 200]
+        created_nodes = sum(1 for status, _ in nodes if status == 200)
+        snap = store.snapshot()
+        missing = [t for t in tokens if snap.subscription_by_token(t) is None]
+        forbidden = [t for t in tokens if request(base, f'/sub/{t}')[0] == 403]
+        node_rows = sum(1 for node in snap.nodes if node['name'].startswith('check-'))
+        guests_missing = [t for t in guest_tokens if snap.subscription_by_token(t) is None]
+        ok = (len(tokens) == n and created_nodes == n and len(guest_tokens) == n
+              and not missing and not forbidden and node_rows == n and not guests_missing)
+        print(f"{label:<16} subs {len(tokens)}/{n} stored {len(tokens) - len(missing)} served {len(tokens) - len(forbidden)}  "
+              f"nodes {created_nodes}/{n} stored {node_rows}  "
+              f"guests {len(guest_tokens)}/{n} stored {len(guest_tokens) - len(guests_missing)}  {'OK' if ok else 'LOST'}")
+        return ok
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发 POST 创建不丢写入检查')
+    parser.add_argument('-n', '--concurrency', type=int, default=20, help='每种资源的并发创建数')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        config = {"nodes": [{"id": "1", "name": "seed", "url": NODE_URL, "limit_gb": 0, "used_bytes": 0}], "subscriptions": []}
+        ok = True
+        for label, make in (
+            ('json sync', lambda path: ConfigStore(path + '.json', durability='sync')),
+            ('json batched', lambda path: ConfigStore(path + '.json', durability='batched')),
+            ('sqlite', lambda path: SqliteConfigStore(path + '.db', import_from=path + '.json')),
+        ):
+            path = os.path.join(tmp, label.replace(' ', '_'))
+            with open(path + '.json', 'w', encoding='utf-8') as f:
+                json.dump(config, f)
+            ok &= check(label, make(path), args.concurrency)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游缓存检查
+起一个本地桩 HTTP 服务，按 200 → 304 → 503 → 过期页面 → 拒绝连接 → 重启 的顺序驱动
+UpstreamCache + UpstreamScheduler，检查条件请求头、失败时回退旧副本、坏响应不覆盖好副本，
+以及熔断器的打开与恢复。
+
+用法:
+  python check_upstream_cache.py
+"""
+
+import sys
+import time
+import base64
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from config_store import ConfigSnapshot, freeze
+from upstream import CircuitBreaker, UpstreamCache, UpstreamScheduler, iter_links
+
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 05 Oct 2026 08:00:00 GMT'
+BODY_V1 = base64.b64encode(b'ss://YWVzLTI1Ni1nY206cGFzcw==@1.2.3.4:8388#a\nss://YWVzLTI1Ni1nY206cGFzcw==@1.2.3.5:8388#b\n')
+BODY_V2 = b'ss://YWVzLTI1Ni1nY206cGFzcw==@1.2.3.6:8388#c\n'
+BACKOFF = 0.3
+
+
+class Stub:
+    """桩服务的当前行为：(状态码, 响应体)，并记录收到的请求头"""
+    response = (200, BODY_V1)
+    seen = []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        Stub.seen.append({k: self.headers.get(k) for k in ('If-None-Match', 'If-Modified-Since')})
+        code, body = Stub.response
+        self.send_response(code)
+        if code == 200:
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): pass
+
+
+class StaticStore:
+    """只有一个上游节点的配置"""
+
+    def __init__(self, url):
+        self._snap = ConfigSnapshot(freeze({"nodes": [{"id": "1", "name": "up", "url": url}], "subscriptions": []}), 1)
+
+    def snapshot(self):
+        return self._snap
+
+
+def serve(port=0):
+    httpd = HTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    httpd = serve()
+    port = httpd.server_address[1]
+    url = f'http://127.0.0.1:{port}/sub'
+    parse = lambda f: list(iter_links(f))
+    cache = UpstreamCache(tmp, timeout=2, parse=parse)
+    scheduler = UpstreamScheduler(cache, parse, StaticStore(url), lambda u: False, interval=0, jitter=0,
+                                  breaker=lambda: CircuitBreaker(2, BACKOFF, BACKOFF * 4))
+    failed = []
+
+    def step(label, expect_source, expect_nodes, expect_state, expect_error):
+        scheduler.refresh_due(wait=True)
+        state = scheduler.status()[0]
+        _, nodes = scheduler.nodes(url)
+        ok = (state["source"] == expect_source and len(nodes) == expect_nodes
+              and state["breaker"]["state"] == expect_state and bool(state["error"]) == expect_error)
+        print(f"{label:<20} source {state['source']:<12} nodes {len(nodes)}  breaker {state['breaker']['state']:<9} "
+              f"error {state['error']!r}  {'OK' if ok else 'FAIL'}")
+        if not ok:
+            failed.append(label)
+
+    try:
+        step('200', 'network', 2, 'closed', False)
+        if Stub.seen[0] != {'If-None-Match': None, 'If-Modified-Since': None}:
+            failed.append('first request sent validators')
+
+        Stub.response = (304, b'')
+        step('304', 'revalidated', 2, 'closed', False)
+        if Stub.seen[-1] != {'If-None-Match': ETAG, 'If-Modified-Since': LAST_MODIFIED}:
+            print(f"conditional headers  {Stub.seen[-1]}  FAIL")
+            failed.append('conditional headers')
+
+        Stub.response = (503, b'busy')
+        step('503', 'stale', 2, 'closed', True)
+        Stub.response = (200, b'token=expired')
+        step('200 expired body', 'stale', 2, 'open', True)
+        requests = len(Stub.seen)
+        step('open (no request)', 'stale', 2, 'open', True)
+        if len(Stub.seen) != requests:
+            failed.append('open breaker still called upstream')
+
+        httpd.shutdown()
+        httpd.server_close()
+        time.sleep(BACKOFF)
+        step('refused (probe)', 'stale', 2, 'open', True)
+        with open(cache.cached(url).path, 'rb') as f:
+            if f.read() != BODY_V1:
+                failed.append('good body was overwritten')
+
+        Stub.response = (200, BODY_V2)
+        httpd = serve(port)
+        time.sleep(BACKOFF * 3)
+        step('restart', 'network', 1, 'closed', False)
+        print(f"cache counts         {cache.stats()}")
+    finally:
+        scheduler.stop()
+        httpd.shutdown()
+        httpd.server_close()
+        shutil.rmtree(tmp, ignore_errors=True)
+    print('OK' if not failed else f"FAILED: {', '.join(failed)}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == '__main__':
+    main()
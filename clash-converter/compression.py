@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub response compression
+Accept-Encoding negotiation and gzip / brotli encoders (brotli only when the
+`brotli` module is installed). Cached bodies keep their compressed variants,
+so a render or a static file is compressed once, not per request.
+"""
+
+import gzip
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server preference, best first
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+# Bodies compressed once and cached get the slow, small settings; per-request ones the fast ones
+CACHED_LEVEL = {'gzip': 9, 'br': 11}
+DYNAMIC_LEVEL = {'gzip': 6, 'br': 5}
+
+
+def compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate(accept_encoding):
+    """Best of ENCODINGS the client accepts (RFC 9110 q-values), or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == 'x-gzip':
+            coding = 'gzip'
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def encode(body, encoding, cached=False):
+    level = (CACHED_LEVEL if cached else DYNAMIC_LEVEL)[encoding]
+    if encoding == 'gzip':
+        # mtime=0 keeps the output (and so its ETag) stable across restarts
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the `encoding` variant of a body whose identity ETag is `etag`."""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+class Variants:
+    """Compressed copies of one immutable body, built on first use."""
+    __slots__ = ('body', '_encoded', '_lock')
+
+    def __init__(self, body):
+        self.body = body
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def get(self, encoding):
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = self._encoded[encoding] = encode(self.body, encoding, cached=True)
+        return data
+
+
+class StreamEncoder:
+    """Incremental encoder for streamed bodies: feed() chunks, then finish()."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._obj = zlib.compressobj(DYNAMIC_LEVEL['gzip'], zlib.DEFLATED, 31)
+        else:
+            self._obj = brotli.Compressor(quality=DYNAMIC_LEVEL['br'])
+
+    def feed(self, data):
+        if self.encoding == 'gzip':
+            return self._obj.compress(data)
+        return self._obj.process(data)
+
+    def finish(self):
+        return self._obj.flush() if self.encoding == 'gzip' else self._obj.finish()
@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub config store
+Keeps config.json resident in memory and hands out immutable snapshots.
+The file is only re-parsed when its inode/mtime/size changes on disk
+(e.g. a helper script edited it) or when the hub writes it itself.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+
+
+class FrozenDict(dict):
+    """Read-only dict used inside snapshots (still JSON serialisable)."""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config snapshot is read-only, edit through the store (load() + save(), insert_*, update_*)")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(obj):
+    """Recursively convert dicts/lists into FrozenDict/tuple."""
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Deep mutable copy of a (frozen) config structure."""
+    # A JSON round trip runs in C and is much faster than a recursive copy
+    return json.loads(json.dumps(obj, ensure_ascii=False))
+
+
+def normalize_config(data):
+    """Migrate v1 list configs and fill in missing traffic fields."""
+    if isinstance(data, list): # Migrate from v1
+        data = {"nodes": [{"id": str(i), "name": f"Node {i+1}", "url": u, "limit_gb": 0, "used_bytes": 0, "expiry": None, "chain_with": None} for i, u in enumerate(data)], "subscriptions": []}
+    if not isinstance(data, dict):
+        return {"nodes": [], "subscriptions": []}
+    if "nodes" not in data: data["nodes"] = []
+    if "subscriptions" not in data: data["subscriptions"] = []
+    # Ensure all nodes/subs have necessary traffic fields
+    for n in data["nodes"]:
+        if 'used_bytes' not in n: n['used_bytes'] = 0
+        if 'limit_gb' not in n: n['limit_gb'] = 0
+    for s in data["subscriptions"]:
+        if 'used_bytes' not in s: s['used_bytes'] = 0
+        if 'limit_gb' not in s: s['limit_gb'] = 0
+        if 'traffic_base' not in s: s['traffic_base'] = {} # map node_id -> base_bytes
+    return data
+
+
+class ConflictError(Exception):
+    """The row changed since the client read it (If-Match failed, HTTP 412)."""
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True)
+
+
+def row_etag(row):
+    """Strong ETag of a stored node/subscription row (content hash)."""
+    return '"%s"' % hashlib.sha1(_dumps(row).encode('utf-8')).hexdigest()[:20]
+
+
+def if_match_ok(if_match, etag):
+    """If-Match check with strong comparison; no header means no precondition."""
+    if not if_match:
+        return True
+    for candidate in if_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def build_index(items, key):
+    """Map item[key] -> position, first occurrence wins (like the old linear scans)."""
+    index = {}
+    for i, item in enumerate(items):
+        k = item.get(key)
+        if k is not None and k not in index:
+            index[k] = i
+    return index
+
+
+class ConfigSnapshot:
+    """One immutable, versioned view of the hub config.
+
+    Carries hash indexes (value -> list position) for node ids, subscription
+    ids and tokens so lookups don't scan the lists.
+    """
+    __slots__ = ('data', 'version', 'node_index', 'sub_index', 'token_index', '_etags')
+
+    def __init__(self, data, version):
+        self.data = data
+        self.version = version
+        self._etags = {}
+        self.node_index = build_index(data["nodes"], "id")
+        self.sub_index = build_index(data["subscriptions"], "id")
+        self.token_index = build_index(data["subscriptions"], "token")
+
+    @property
+    def nodes(self):
+        return self.data["nodes"]
+
+    @property
+    def subscriptions(self):
+        return self.data["subscriptions"]
+
+    def node(self, node_id):
+        i = self.node_index.get(node_id)
+        return None if i is None else self.data["nodes"][i]
+
+    def subscription(self, sub_id):
+        i = self.sub_index.get(sub_id)
+        return None if i is None else self.data["subscriptions"][i]
+
+    def subscription_by_token(self, token):
+        i = self.token_index.get(token)
+        return None if i is None else self.data["subscriptions"][i]
+
+    def select_nodes(self, node_ids):
+        """Nodes whose id is in node_ids, in config order."""
+        positions = sorted({self.node_index[nid] for nid in node_ids if nid in self.node_index})
+        nodes = self.data["nodes"]
+        return [nodes[i] for i in positions]
+
+    def thaw(self):
+        """Mutable deep copy; list positions match the indexes of this snapshot."""
+        return thaw(self.data)
+
+    def etag(self, row):
+        """row_etag() memoized for the rows of this snapshot."""
+        key = id(row)
+        tag = self._etags.get(key)
+        if tag is None:
+            tag = self._etags[key] = row_etag(row)
+        return tag
+
+    def checked_row(self, table, item_id, if_match):
+        """Position of a row after checking If-Match; KeyError / ConflictError otherwise."""
+        index = self.node_index if table == "nodes" else self.sub_index
+        i = index.get(item_id)
+        if i is None:
+            raise KeyError(item_id)
+        if not if_match_ok(if_match, self.etag(self.data[table][i])):
+            raise ConflictError(item_id)
+        return i
+
+
+def new_id(existing, scale=1):
+    """Time-based id as before, bumped until it is unique (ids are primary keys now)."""
+    n = int(time.time() * scale)
+    while str(n) in existing:
+        n += 1
+    return str(n)
+
+
+def _put_row(config, table, item):
+    """Replace the row with item's id in config[table], or append it."""
+    rows = config[table]
+    for i, row in enumerate(rows):
+        if row.get('id') == item['id']:
+            rows[i] = item
+            return
+    rows.append(item)
+
+
+def _delete_row(config, table, item_id):
+    config[table] = [r for r in config[table] if r.get('id') != item_id]
+
+
+DURABILITY_MODES = ('sync', 'batched')
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file, fsync it and rename it over path."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        # Make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # Not supported on every platform/filesystem
+
+
+class ConfigStore:
+    """Parse-once config holder with change-detected reloads (config.json backend).
+
+    Readers call snapshot(), which costs one os.stat() and never takes the
+    lock unless the file actually changed. Writers go through save() or the
+    row-level put_*/delete_* helpers (which rewrite the whole file here).
+
+    durability='sync' writes the file before save() returns. 'batched'
+    publishes the snapshot at once and writes the file `flush_delay`
+    seconds after the first unsaved change, so a burst of edits costs one
+    write. Call flush() (or close()) before exiting in batched mode.
+    """
+
+    def __init__(self, path, durability='sync', flush_delay=0.5):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.path = path
+        self.durability = durability
+        self.flush_delay = flush_delay
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._snapshot = None
+        self._file_key = None
+        self._version = 0
+        self._pending = None  # Config published but not yet on disk
+        self._flushing = False
+        self._timer = None
+        self.writes = 0
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _publish(self, data, key):
+        self._version += 1
+        self._snapshot = ConfigSnapshot(freeze(data), self._version)
+        self._file_key = key
+        return self._snapshot
+
+    def snapshot(self):
+        """Return the current snapshot, reloading only if the file changed."""
+        snap = self._snapshot
+        key = self._stat_key()
+        if snap is not None and key == self._file_key:
+            return snap
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if self._snapshot is not None and key == self._file_key:
+                return self._snapshot
+            if self._pending is not None or self._flushing:
+                # Memory is ahead of the file until the pending write lands
+                return self._snapshot
+            data = None
+            if key is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = normalize_config(json.load(f))
+                except Exception as e:
+                    print(f"Error loading config: {e}")
+                    if self._snapshot is not None:
+                        # Keep serving the last good config, don't retry until the file changes again
+                        self._file_key = key
+                        return self._snapshot
+            if data is None:
+                data = {"nodes": [], "subscriptions": []}
+            return self._publish(data, key)
+
+    def load(self):
+        """Mutable deep copy of the current config, for edit-then-save callers."""
+        return self.snapshot().thaw()
+
+    def save(self, config):
+        """Publish config as the new snapshot and write it (now, or batched)."""
+        config = normalize_config(config)
+        if self.durability == 'sync':
+            with self._flush_lock, self._lock:
+                write_json_atomic(self.path, config)
+                self.writes += 1
+                return self._publish(config, self._stat_key())
+        with self._lock:
+            snap = self._publish(config, self._file_key)
+            self._pending = snap.data
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return snap
+
+    def flush(self):
+        """Write any pending batched changes to disk."""
+        with self._flush_lock:
+            with self._lock:
+                data, self._pending = self._pending, None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if data is None:
+                    return
+                self._flushing = True
+            try:
+                write_json_atomic(self.path, data)
+                self.writes += 1
+            except Exception:
+                with self._lock:
+                    if self._pending is None:
+                        self._pending = data  # Keep it for the next flush
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = False
+                    self._file_key = self._stat_key()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error saving config: {e}")
+
+    def close(self):
+        self.flush()
+
+    def _edit(self, fn):
+        with self._write_lock:
+            config = self.load()
+            fn(config)
+            return self.save(config)
+
+    def _insert(self, table, item, scale):
+        with self._write_lock:
+            snap = self.snapshot()
+            item_id = new_id(snap.node_index if table == "nodes" else snap.sub_index, scale)
+            config = snap.thaw()
+            config[table].append(dict(item, id=item_id))
+            self.save(config)
+            return item_id
+
+    def insert_node(self, node, scale=1):
+        """Append node under a fresh id picked under the write lock (never replaces a row); returns the id."""
+        return self._insert("nodes", node, scale)
+
+    def insert_subscription(self, sub, scale=1):
+        return self._insert("subscriptions", sub, scale)
+
+    def put_node(self, node):
+        return self._edit(lambda c: _put_row(c, "nodes", node))
+
+    def delete_node(self, node_id):
+        return self._edit(lambda c: _delete_row(c, "nodes", node_id))
+
+    def put_subscription(self, sub):
+        return self._edit(lambda c: _put_row(c, "subscriptions", sub))
+
+    def delete_subscription(self, sub_id):
+        return self._edit(lambda c: _delete_row(c, "subscriptions", sub_id))
+
+    def _update(self, table, item_id, fn, if_match):
+        with self._write_lock:
+            snap = self.snapshot()
+            i = snap.checked_row(table, item_id, if_match)
+            config = snap.thaw()
+            if fn is None:
+                del config[table][i]
+            else:
+                fn(config[table][i])
+            return self.save(config)
+
+    def update_node(self, node_id, fn, if_match=None):
+        """Atomically apply fn(node) to the latest row, optionally guarded by If-Match."""
+        return self._update("nodes", node_id, fn, if_match)
+
+    def update_subscription(self, sub_id, fn, if_match=None):
+        return self._update("subscriptions", sub_id, fn, if_match)
+
+    def remove_node(self, node_id, if_match=None):
+        return self._update("nodes", node_id, None, if_match)
+
+    def remove_subscription(self, sub_id, if_match=None):
+        return self._update("subscriptions", sub_id, None, if_match)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (id TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS subscriptions (id TEXT PRIMARY KEY, position INTEGER NOT NULL, token TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS subscriptions_token ON subscriptions(token);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class SqliteConfigStore:
+    """Row-level SQLite backend (WAL mode) with the same interface as ConfigStore.
+
+    Nodes and subscriptions are one row each, so put_*/delete_* commit a
+    single-row transaction and save() only writes the rows that differ from
+    the current snapshot. Changes committed by other processes are picked
+    up through PRAGMA data_version, checked at most every `check_interval`.
+    durability='sync' fsyncs every commit (synchronous=FULL); 'batched'
+    leaves that to WAL checkpoints (synchronous=NORMAL) and flush().
+    """
+
+    def __init__(self, path, import_from=None, check_interval=1.0, durability='sync'):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.path = path
+        self.durability = durability
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._data_version = None
+        self._checked_at = 0
+        self._version = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=%s' % ('FULL' if durability == 'sync' else 'NORMAL'))
+        self._conn.executescript(SCHEMA)
+        empty = not self._conn.execute('SELECT 1 FROM nodes UNION ALL SELECT 1 FROM subscriptions LIMIT 1').fetchone()
+        if empty and import_from and os.path.exists(import_from):
+            import_json(self, import_from)
+
+    # --- reading ---
+
+    def _read_all(self):
+        data = {}
+        for key, value in self._conn.execute('SELECT key, value FROM meta'):
+            data[key] = json.loads(value)
+        data["nodes"] = [json.loads(row[0]) for row in self._conn.execute('SELECT data FROM nodes ORDER BY position')]
+        data["subscriptions"] = [json.loads(row[0]) for row in self._conn.execute('SELECT data FROM subscriptions ORDER BY position')]
+        return normalize_config(data)
+
+    def _publish(self, data):
+        self._version += 1
+        self._snapshot = ConfigSnapshot(data, self._version)
+        return self._snapshot
+
+    def _refresh(self):
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._checked_at = time.monotonic()
+        if self._snapshot is None or data_version != self._data_version:
+            self._data_version = data_version
+            self._publish(freeze(self._read_all()))
+
+    def snapshot(self):
+        """Current snapshot; readers never block on a writer holding the lock."""
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snap
+        if not self._lock.acquire(blocking=snap is None):
+            return snap
+        try:
+            self._refresh()
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def load(self):
+        return self.snapshot().thaw()
+
+    # --- writing ---
+
+    def _transaction(self, statements):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, args in statements:
+                self._conn.execute(sql, args)
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _row_statement(table, item, position, upsert=True):
+        """INSERT for one row; upsert=False makes an existing id fail with IntegrityError."""
+        if table == "subscriptions":
+            sql = 'INSERT INTO subscriptions (id, position, token, data) VALUES (?, ?, ?, ?)'
+            conflict = ' ON CONFLICT(id) DO UPDATE SET position=excluded.position, token=excluded.token, data=excluded.data'
+            args = (item["id"], position, item.get("token"), _dumps(item))
+        else:
+            sql = 'INSERT INTO nodes (id, position, data) VALUES (?, ?, ?)'
+            conflict = ' ON CONFLICT(id) DO UPDATE SET position=excluded.position, data=excluded.data'
+            args = (item["id"], position, _dumps(item))
+        return (sql + conflict if upsert else sql), args
+
+    def _put(self, table, item):
+        item = normalize_config({table: [thaw(item)]})[table][0]
+        with self._lock:
+            self._refresh()
+            snap = self._snapshot
+            index = snap.node_index if table == "nodes" else snap.sub_index
+            rows = list(snap.data[table])
+            i = index.get(item["id"])
+            if i is None:
+                position = self._conn.execute(f'SELECT COALESCE(MAX(position), -1) + 1 FROM {table}').fetchone()[0]
+                sql, args = self._row_statement(table, item, position)
+                rows.append(freeze(item))
+            else:
+                # Keep the stored position when updating an existing row
+                position = self._conn.execute(f'SELECT position FROM {table} WHERE id = ?', (item["id"],)).fetchone()[0]
+                sql, args = self._row_statement(table, item, position)
+                rows[i] = freeze(item)
+            self._transaction([(sql, args)])
+            return self._publish(FrozenDict(snap.data, **{table: tuple(rows)}))
+
+    def _insert(self, table, item, scale):
+        item = normalize_config({table: [thaw(item)]})[table][0]
+        with self._lock:
+            self._refresh()
+            snap = self._snapshot
+            taken = set(snap.node_index if table == "nodes" else snap.sub_index)
+            raced = False
+            while True:
+                item["id"] = new_id(taken, scale)
+                position = self._conn.execute(f'SELECT COALESCE(MAX(position), -1) + 1 FROM {table}').fetchone()[0]
+                try:
+                    self._transaction([self._row_statement(table, item, position, upsert=False)])
+                    break
+                except sqlite3.IntegrityError:
+                    # Another process took the id since our last refresh
+                    taken.add(item["id"])
+                    raced = True
+            if raced:
+                self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+                self._publish(freeze(self._read_all()))
+            else:
+                self._publish(FrozenDict(snap.data, **{table: snap.data[table] + (freeze(item),)}))
+            return item["id"]
+
+    def _delete(self, table, item_id):
+        with self._lock:
+            self._refresh()
+            snap = self._snapshot
+            self._transaction([(f'DELETE FROM {table} WHERE id = ?', (item_id,))])
+            rows = tuple(r for r in snap.data[table] if r.get("id") != item_id)
+            return self._publish(FrozenDict(snap.data, **{table: rows}))
+
+    def insert_node(self, node, scale=1):
+        """Append node under a fresh id; a plain INSERT, so an id taken meanwhile is bumped, never replaced."""
+        return self._insert("nodes", node, scale)
+
+    def insert_subscription(self, sub, scale=1):
+        return self._insert("subscriptions", sub, scale)
+
+    def put_node(self, node):
+        return self._put("nodes", node)
+
+    def delete_node(self, node_id):
+        return self._delete("nodes", node_id)
+
+    def put_subscription(self, sub):
+        return self._put("subscriptions", sub)
+
+    def delete_subscription(self, sub_id):
+        return self._delete("subscriptions", sub_id)
+
+    def flush(self):
+        """Checkpoint the WAL so every committed change is in the main database file."""
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def _update(self, table, item_id, fn, if_match):
+        with self._lock:
+            self._refresh()
+            snap = self._snapshot
+            i = snap.checked_row(table, item_id, if_match)
+            if fn is None:
+                return self._delete(table, item_id)
+            item = thaw(snap.data[table][i])
+            fn(item)
+            return self._put(table, item)
+
+    def update_node(self, node_id, fn, if_match=None):
+        """Atomically apply fn(node) to the latest row, optionally guarded by If-Match."""
+        return self._update("nodes", node_id, fn, if_match)
+
+    def update_subscription(self, sub_id, fn, if_match=None):
+        return self._update("subscriptions", sub_id, fn, if_match)
+
+    def remove_node(self, node_id, if_match=None):
+        return self._update("nodes", node_id, None, if_match)
+
+    def remove_subscription(self, sub_id, if_match=None):
+        return self._update("subscriptions", sub_id, None, if_match)
+
+    def save(self, config):
+        """Whole-config save for legacy callers: only rows that changed are written."""
+        config = normalize_config(config)
+        with self._lock:
+            self._refresh()
+            snap = self._snapshot
+            statements = []
+            for table in ("nodes", "subscriptions"):
+                old = {r.get("id"): _dumps(r) for r in snap.data[table]}
+                old_pos = {r.get("id"): i for i, r in enumerate(snap.data[table])}
+                seen = set()
+                for position, item in enumerate(config[table]):
+                    if item["id"] in seen:
+                        continue
+                    seen.add(item["id"])
+                    if old.get(item["id"]) != _dumps(item) or old_pos.get(item["id"]) != position:
+                        statements.append(self._row_statement(table, item, position))
+                for item_id in old:
+                    if item_id not in seen:
+                        statements.append((f'DELETE FROM {table} WHERE id = ?', (item_id,)))
+            for key, value in config.items():
+                if key in ("nodes", "subscriptions"):
+                    continue
+                if key not in snap.data or _dumps(snap.data[key]) != _dumps(value):
+                    statements.append(('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, _dumps(value))))
+            for key in snap.data:
+                if key not in config:
+                    statements.append(('DELETE FROM meta WHERE key = ?', (key,)))
+            if statements:
+                self._transaction(statements)
+            return self._publish(freeze(config))
+
+
+def import_json(store, json_path):
+    """One-shot import of an existing config.json into a SqliteConfigStore."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        config = normalize_config(json.load(f))
+    for table in ("nodes", "subscriptions"):
+        seen = set()
+        for item in config[table]:
+            # Old ids are time-based and can collide, the primary key can't
+            base_id, n = str(item.get("id")), 1
+            while item.get("id") in seen:
+                n += 1
+                item["id"] = f"{base_id}-{n}"
+            if n > 1:
+                print(f"Import: duplicate {table} id {base_id} renamed to {item['id']}")
+            seen.add(item["id"])
+    store.save(config)
+    return config
+
+
+def open_store(backend, json_path, db_path, durability='sync', flush_delay=0.5):
+    """ConfigStore for 'json' (default) or SqliteConfigStore for 'sqlite'."""
+    if backend == 'sqlite':
+        return SqliteConfigStore(db_path, import_from=json_path, durability=durability)
+    return ConfigStore(json_path, durability=durability, flush_delay=flush_delay)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Import Sub Hub config.json into the SQLite storage backend')
+    parser.add_argument('json_path', help='existing config.json')
+    parser.add_argument('db_path', help='target SQLite database (e.g. config.db)')
+    args = parser.parse_args()
+
+    store = SqliteConfigStore(args.db_path)
+    if store.snapshot().nodes or store.snapshot().subscriptions:
+        print(f"{args.db_path} already has data, refusing to import over it")
+        sys.exit(1)
+    config = import_json(store, args.json_path)
+    print(f"Imported {len(config['nodes'])} nodes and {len(config['subscriptions'])} subscriptions into {args.db_path}")
+
+
+if __name__ == '__main__':
+    main()
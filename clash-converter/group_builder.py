@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub proxy-group assembly
+Dialer lookup and select/url-test group merging over name and managed-id
+indexes, so a profile with thousands of upstream nodes and dozens of groups
+is assembled in linear time.
+"""
+
+# Group members that are kept even though they are not proxies of the profile
+BUILTIN_TARGETS = frozenset(('DIRECT', 'REJECT'))
+
+
+class ProxyIndex:
+    """Name lookups over a profile's proxy list, front-to-back like a linear scan.
+
+    Proxies prepended with add_front() (chain landing proxies) are searched
+    before the indexed ones, matching the order of the final list.
+    """
+
+    def __init__(self, proxies):
+        self.proxies = proxies
+        self.front = []
+        self.by_id = {}
+        for proxy in proxies:
+            managed_id = proxy.get('managed_id')
+            if managed_id is not None:
+                self.by_id.setdefault(managed_id, proxy)
+        self._lower = None
+        self._contains = {}
+
+    def add_front(self, proxy):
+        self.front.insert(0, proxy)
+
+    def first(self):
+        """Name of the first proxy, or None."""
+        proxies = self.front or self.proxies
+        return proxies[0]['name'] if proxies else None
+
+    def with_id(self, managed_id):
+        """Name of the first proxy from managed node `managed_id`, or None."""
+        for proxy in self.front:
+            if proxy.get('managed_id') == managed_id:
+                return proxy['name']
+        proxy = self.by_id.get(managed_id)
+        return proxy['name'] if proxy else None
+
+    def name_contains(self, needle, ignore_case=False):
+        """Name of the first proxy whose name contains `needle`; memoized per needle."""
+        if ignore_case:
+            needle = needle.lower()
+        for proxy in self.front:
+            name = proxy['name'].lower() if ignore_case else proxy['name']
+            if needle in name:
+                return proxy['name']
+        key = (needle, ignore_case)
+        if key not in self._contains:
+            if ignore_case and self._lower is None:
+                self._lower = [p['name'].lower() for p in self.proxies]
+            names = self._lower if ignore_case else [p['name'] for p in self.proxies]
+            self._contains[key] = next((self.proxies[i]['name'] for i, name in enumerate(names) if needle in name), None)
+        return self._contains[key]
+
+    def all(self):
+        return self.front + self.proxies
+
+
+def build_relays(proxies, names):
+    """Relay groups for proxies with `chain_with` pointing at another proxy name."""
+    relays = []
+    for proxy in proxies:
+        target_name = proxy.get('chain_with')
+        if target_name and target_name in names:
+            relays.append({
+                "name": f"🔗 {proxy['name']} -> {target_name}",
+                "type": "relay",
+                "proxies": [target_name, proxy['name']]
+            })
+    return relays
+
+
+def merge_url_test(current, names, allowed):
+    """Template members first, then missing `names`; keep only `allowed`."""
+    seen = set(current)
+    merged = list(current)
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            merged.append(name)
+    return [p for p in merged if p in allowed]
+
+
+def merge_select(current, names, allowed):
+    """Like merge_url_test, but new names go in front of the first DIRECT; DIRECT/REJECT are kept."""
+    seen = set(current)
+    if 'DIRECT' in seen:
+        split = current.index('DIRECT')
+        head, tail = current[:split], current[split:]
+    else:
+        head, tail = list(current), []
+    for name in names:
+        if name in seen:
+            continue
+        seen.add(name)
+        if not tail and name == 'DIRECT':
+            tail = [name]
+        else:
+            head.append(name)
+    return [p for p in head + tail if p in allowed or p in BUILTIN_TARGETS]
+
+
+def assemble_groups(groups, proxy_names, relay_names):
+    """Fill select/url-test groups in place with the profile's proxies and relays."""
+    proxy_set = set(proxy_names)
+    select_names = proxy_names + relay_names
+    select_set = proxy_set.union(relay_names)
+    for group in groups:
+        group_type = group.get('type', '')
+        if group_type == 'url-test':
+            group['proxies'] = merge_url_test(group.get('proxies', []), proxy_names, proxy_set)
+        elif group_type == 'select':
+            group['proxies'] = merge_select(group.get('proxies', []), select_names, select_set)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub caches
+Small thread-safe LRU caches used on the subscription request path.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from compression import Variants
+
+
+def clone(obj):
+    """Structural copy of plain dict/list data (much cheaper than deepcopy)."""
+    if isinstance(obj, dict):
+        return {k: clone(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [clone(v) for v in obj]
+    return obj
+
+
+class LRUCache:
+    """Bounded mapping with least-recently-used eviction and hit/miss counters."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ParsedNodeCache:
+    """Raw proxy link -> parsed Clash proxy dict.
+
+    Entries are kept private and every caller gets its own copy, so per-request
+    overrides (name, managed_id, chain_with, server) never touch the cache.
+    Parse errors are cached too, a bad link stays bad until its text changes.
+    """
+
+    def __init__(self, parse, max_size=4096):
+        self._parse = parse
+        self._cache = LRUCache(max_size)
+
+    def parse(self, link):
+        link = link.strip()
+        entry = self._cache.get(link)
+        if entry is None:
+            try:
+                entry = (True, self._parse(link))
+            except ValueError as e:
+                entry = (False, str(e))  # Only the message: a kept exception would grow its traceback on every raise
+            self._cache.put(link, entry)
+        ok, value = entry
+        if not ok:
+            raise ValueError(value)
+        return clone(value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RenderedEntry:
+    """One rendered subscription body plus its strong ETag and compressed variants."""
+    __slots__ = ('version', 'body', 'etag', 'expires_at', 'variants')
+
+    def __init__(self, version, body, expires_at=None):
+        self.version = version
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.expires_at = expires_at
+        self.variants = Variants(body)
+
+
+class RenderCache:
+    """Subscription token -> last rendered body, valid while the version key matches.
+
+    The version key covers everything the body depends on (config snapshot,
+    template, public IP, versions of the upstream sources used); an
+    optional TTL bounds entries whose inputs can't be versioned.
+    """
+
+    def __init__(self, max_size=1024):
+        self._cache = LRUCache(max_size)
+        self.stale = 0
+
+    def get(self, token, version):
+        entry = self._cache.get(token)
+        if entry is None:
+            return None
+        if entry.version != version or (entry.expires_at is not None and time.time() >= entry.expires_at):
+            self.stale += 1
+            return None
+        return entry
+
+    def put(self, token, version, body, ttl=None):
+        entry = RenderedEntry(version, body, time.time() + ttl if ttl else None)
+        self._cache.put(token, entry)
+        return entry
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return dict(self._cache.stats(), stale=self.stale)
+
+
+class TemplateEntry:
+    __slots__ = ('mtime', 'version', 'data', 'checked_at', 'fragments')
+
+    def __init__(self, mtime, version, data, checked_at):
+        self.mtime = mtime
+        self.version = version
+        self.data = data
+        self.checked_at = checked_at
+        self.fragments = {}  # top-level key -> serialized text
+
+
+class TemplateCache:
+    """Template path -> parsed template, loaded once and copied per render.
+
+    A template is re-read when its mtime changes; the file is stat()ed at
+    most every `check_interval` seconds, so most requests never touch the
+    filesystem. clear() (wired to SIGHUP) forces a reload on next use.
+    Like ParsedNodeCache, the parsed data stays private and get() hands
+    out structural copies. Missing files are cached as None too.
+    """
+
+    def __init__(self, load, check_interval=5.0):
+        self._load = load
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.loads = 0
+
+    def _entry(self, path):
+        entry = self._entries.get(path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if entry is not None and entry.mtime == mtime:
+                entry.checked_at = now
+                return entry
+            data = None
+            if mtime is not None:
+                try:
+                    data = self._load(path)
+                    self.loads += 1
+                except Exception as e:
+                    print(f"Error loading template {path}: {e}")
+                    if entry is not None:
+                        # Keep the last good version until the file changes again
+                        entry.mtime, entry.checked_at = mtime, now
+                        return entry
+            self._generation += 1
+            entry = self._entries[path] = TemplateEntry(mtime, self._generation, data, now)
+            return entry
+
+    def exists(self, path):
+        return self._entry(path).data is not None
+
+    def version(self, path):
+        """Changes whenever the template at path is (re)loaded."""
+        return self._entry(path).version
+
+    def get(self, path):
+        """Fresh mutable copy of the template, or None if the file doesn't exist."""
+        data = self._entry(path).data
+        return None if data is None else clone(data)
+
+    def fragment(self, path, key, render):
+        """render(value) of the template's top-level `key`, computed once per template version.
+
+        For keys a render never modifies, so streamed responses can send
+        the static part of the profile pre-serialized.
+        """
+        entry = self._entry(path)
+        text = entry.fragments.get(key)
+        if text is None:
+            text = entry.fragments[key] = render(entry.data[key])
+        return text
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"templates": len(self._entries), "loads": self.loads}
+
+
+class StaticEntry:
+    __slots__ = ('mtime', 'body', 'etag', 'variants')
+
+    def __init__(self, mtime, body):
+        self.mtime = mtime
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.variants = Variants(body)
+
+
+class StaticCache:
+    """Static file path -> contents (plus compressed variants), re-read when the mtime changes."""
+
+    def __init__(self, max_size=64):
+        self._cache = LRUCache(max_size)
+
+    def get(self, path):
+        """Entry for the file at path, or None if it isn't a readable file."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        entry = self._cache.get(path)
+        if entry is None or entry.mtime != mtime:
+            try:
+                with open(path, 'rb') as f:
+                    entry = StaticEntry(mtime, f.read())
+            except OSError:
+                return None
+            self._cache.put(path, entry)
+        return entry
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (weak comparison, as RFC 7232 asks for GET)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
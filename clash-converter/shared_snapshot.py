@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub shared snapshots
+Multi-process mode: the primary process publishes its config, traffic, usage,
+public IP and upstream versions into one memory-mapped file, and worker
+processes read them from there instead of polling or writing anything.
+"""
+
+import os
+import json
+import mmap
+import struct
+import threading
+import time
+import zlib
+from types import MappingProxyType
+
+from config_store import ConfigSnapshot, freeze
+from traffic import TrafficSnapshot
+
+MAGIC = b'SHUB'
+# magic, seq (odd while a write is in progress), payload length, payload crc32
+HEADER = struct.Struct('<4s4xQQI4x')
+READ_RETRIES = 100
+
+
+class SnapshotPublisher:
+    """Writes JSON states into a memory-mapped file guarded by a sequence counter.
+
+    The file starts at `capacity` bytes of payload and doubles when a state
+    outgrows it; readers notice the new size and remap.
+    """
+
+    def __init__(self, path, capacity=4 * 1024 * 1024):
+        self.path = path
+        self.seq = 0
+        self.size = 0
+        self.publishes = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.ftruncate(self._fd, HEADER.size + capacity)
+        self._map = mmap.mmap(self._fd, HEADER.size + capacity)
+        HEADER.pack_into(self._map, 0, MAGIC, 0, 0, 0)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _reserve(self, size):
+        needed = HEADER.size + size
+        if needed <= len(self._map):
+            return
+        length = len(self._map)
+        while length < needed:
+            length *= 2
+        os.ftruncate(self._fd, length)
+        self._map.close()
+        self._map = mmap.mmap(self._fd, length)
+
+    def publish(self, state):
+        """Make `state` (JSON serialisable) the current one; returns its sequence number."""
+        payload = json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            self._reserve(len(payload))
+            HEADER.pack_into(self._map, 0, MAGIC, self.seq + 1, self.size, 0)
+            self._map[HEADER.size:HEADER.size + len(payload)] = payload
+            self.seq += 2
+            self.size = len(payload)
+            HEADER.pack_into(self._map, 0, MAGIC, self.seq, self.size, zlib.crc32(payload))
+            self.publishes += 1
+            return self.seq
+
+    def start(self, key, build, interval=0.5):
+        """Publish build() whenever key() changes, checked every `interval` seconds."""
+        def loop():
+            last = None
+            while not self._stop.is_set():
+                try:
+                    current = key()
+                    if current != last:
+                        self.publish(build())
+                        last = current
+                except Exception as e:
+                    print(f"Snapshot publish error: {e}")
+                self._stop.wait(interval)
+        if self._thread is None:
+            self._thread = threading.Thread(target=loop, name='snapshot-publisher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._map.close()
+            os.close(self._fd)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {"seq": self.seq, "bytes": self.size, "capacity": len(self._map) - HEADER.size, "publishes": self.publishes}
+
+
+class SnapshotReader:
+    """Read-only view of a SnapshotPublisher file; state() decodes only when the sequence moves."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        self._map = None
+        self._seq = None  # Nothing decoded yet (0 in the file means nothing published)
+        self._state = None
+        self._lock = threading.Lock()
+        self._remap()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size, access=mmap.ACCESS_READ)
+
+    def seq(self):
+        return HEADER.unpack_from(self._map, 0)[1]
+
+    def wait(self, timeout=None, interval=0.1):
+        """Block until a first state has been published; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.seq() == 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def state(self):
+        """The latest published state (dict); LookupError if nothing was published yet."""
+        if HEADER.unpack_from(self._map, 0)[1] == self._seq:
+            return self._state
+        with self._lock:
+            for _ in range(READ_RETRIES):
+                magic, seq, size, crc = HEADER.unpack_from(self._map, 0)
+                if seq == self._seq:
+                    return self._state
+                if magic != MAGIC or seq == 0:
+                    break
+                if seq & 1:
+                    time.sleep(0.001)  # Write in progress
+                    continue
+                if HEADER.size + size > len(self._map):
+                    self._remap()  # The publisher grew the file
+                    continue
+                payload = self._map[HEADER.size:HEADER.size + size]
+                if HEADER.unpack_from(self._map, 0)[1] != seq or zlib.crc32(payload) != crc:
+                    continue  # Overwritten while we copied it
+                self._state = json.loads(payload)
+                self._seq = seq
+                return self._state
+        if self._state is None:
+            raise LookupError("no snapshot published yet")
+        return self._state
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+# --- Read-only stand-ins for the primary's objects, as used by the render path ---
+
+class SharedConfigStore:
+    """ConfigStore.snapshot() from the published config."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._snapshot = None
+
+    def snapshot(self):
+        config = self.reader.state()["config"]
+        snap = self._snapshot
+        if snap is None or snap.version != config["version"]:
+            snap = self._snapshot = ConfigSnapshot(freeze(config["data"]), config["version"])
+        return snap
+
+
+class SharedTraffic:
+    """TrafficPoller.snapshot() from the published traffic counters."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._snapshot = TrafficSnapshot()
+
+    def snapshot(self):
+        traffic = self.reader.state()["traffic"]
+        snap = self._snapshot
+        if snap.version != traffic["version"]:
+            # JSON object keys are strings; the poller keys ports by int
+            port_bytes = MappingProxyType({int(port): b for port, b in traffic["port_bytes"].items()})
+            snap = self._snapshot = TrafficSnapshot(traffic["version"], port_bytes,
+                                                    MappingProxyType(traffic["node_ports"]), traffic["taken_at"])
+        return snap
+
+
+class SharedUsage:
+    """UsageLedger lookups from the published per-subscription totals (the primary keeps the ledger)."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def sync(self, config_snap, traffic):
+        pass
+
+    def usage(self, sub_id):
+        return self.reader.state()["usage"].get(sub_id, 0)
+
+
+class SharedPublicIP:
+    def __init__(self, reader):
+        self.reader = reader
+
+    def get(self, snap=None):
+        return self.reader.state()["public_ip"]
+
+
+class SharedUpstreams:
+    """UpstreamScheduler.nodes() / tracks() from the published versions and the on-disk cache.
+
+    The primary stores every fetched body in the UpstreamCache directory
+    before publishing its new version, so a worker re-parses the cached
+    copy once per version instead of fetching anything itself.
+    """
+
+    def __init__(self, reader, cache, parse):
+        self.reader = reader
+        self.cache = cache
+        self.parse = parse
+        self._nodes = {}  # url -> (version, nodes)
+        self._lock = threading.Lock()
+
+    def _load(self, url):
+        cached = self.cache.cached(url)
+        if cached is None:
+            return ()
+        try:
+            with cached.open() as f:
+                return tuple(self.parse(f))
+        except Exception as e:
+            print(f"Error parsing cached upstream {url}: {e}")
+            return ()
+
+    def nodes(self, url):
+        versions = self.reader.state()["upstreams"]
+        if url not in versions:
+            return 0, self._load(url)
+        version = versions[url]
+        entry = self._nodes.get(url)
+        if entry is None or entry[0] != version:
+            entry = (version, self._load(url))
+            with self._lock:
+                self._nodes[url] = entry
+                for stale in [u for u in self._nodes if u not in versions]:
+                    del self._nodes[stale]
+        return entry
+
+    def tracks(self, url):
+        return url in self.reader.state()["upstreams"]
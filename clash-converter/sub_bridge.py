@@ -9,13 +9,16 @@ and traffic reporting headers for Clash.
 import os
 import sys
 import json
-import base64
 import urllib.request
 import subprocess
 import time
+import signal
+import html
+import socket
+import argparse
+import http.client
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
-import yaml
 from urllib.parse import urlparse, parse_qs
 import random
 import string
@@ -30,19 +33,122 @@ sys.path.append(script_dir)
 
 try:
     from convert import ProxyParser, ClashConfigGenerator
+    from async_server import AsyncServer
+    from compression import StreamEncoder, compressible, encode, encoded_etag, negotiate
+    from config_store import ConflictError, open_store
+    from group_builder import ProxyIndex, assemble_groups, build_relays
+    from hub_cache import ParsedNodeCache, RenderCache, StaticCache, TemplateCache, clone, etag_matches
+    from shared_snapshot import (SharedConfigStore, SharedPublicIP, SharedTraffic, SharedUpstreams, SharedUsage,
+                                 SnapshotPublisher, SnapshotReader)
+    from traffic import TrafficPoller, UsageLedger
+    from traffic_history import TrafficHistory
+    from upstream import (AdHocSources, CircuitBreaker, PrivateTargetError, UpstreamCache, UpstreamScheduler,
+                          iter_clash_proxies, iter_links, sniff_clash_yaml)
+    import yaml_io
 except ImportError:
-    print("Error: convert.py not found in the same directory.")
+    print("Error: Sub Hub modules (convert.py, async_server.py, compression.py, config_store.py, group_builder.py, hub_cache.py, shared_snapshot.py, traffic*.py, upstream.py, yaml_io.py) not found in the same directory.")
     sys.exit(1)
 
 # --- Configuration ---
 PORT = 8080
 SECRET_PATH = "my-stable-sub"
 CONFIG_FILE = os.path.join(script_dir, 'config.json')
+CONFIG_DB = os.path.join(script_dir, 'config.db')
+STORAGE_BACKEND = os.environ.get('SUB_HUB_STORAGE', 'json')  # 'json' (config.json) or 'sqlite' (config.db)
+# 'batched' coalesces admin edits into one write per FLUSH_DELAY; 'sync' writes before responding
+DURABILITY = os.environ.get('SUB_HUB_DURABILITY', 'batched')
+FLUSH_DELAY = float(os.environ.get('SUB_HUB_FLUSH_DELAY', 0.5))  # seconds
 LOCAL_TEMPLATE = os.path.join(script_dir, 'templates', 'base-rules.yaml')
 DASHBOARD_FILE = os.path.join(script_dir, 'dashboard.html')
+PARSE_CACHE_SIZE = 4096  # Max distinct proxy links kept parsed in memory
+RENDER_CACHE_SIZE = 1024  # Max rendered subscription bodies kept for ETag/304
+# Profiles with at least this many proxies are streamed (chunked, uncached) instead of rendered whole, 0 = never
+STREAM_MIN_PROXIES = int(os.environ.get('SUB_HUB_STREAM_MIN_PROXIES', 0))
+STREAM_CHUNK_SIZE = 64 * 1024  # bytes buffered per chunk when streaming
+STREAM_KEYS = ('proxies', 'proxy-groups')  # profile keys written item by item; the rest is template-static
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth a Content-Encoding
+KEEPALIVE_TIMEOUT = 15  # seconds an idle keep-alive connection (or a new one) may wait for a request line
+KEEPALIVE_MAX_REQUESTS = 100  # requests per connection before the server closes it
+REQUEST_TIMEOUT = 120  # seconds of socket inactivity allowed while a request is read and answered
+# --engine asyncio (or SUB_HUB_ENGINE=asyncio): event loop + bounded worker pool instead of a thread per connection
+ENGINE = os.environ.get('SUB_HUB_ENGINE', 'threaded')
+ASYNC_WORKERS = int(os.environ.get('SUB_HUB_WORKERS', 16))  # threads running request handlers
+ASYNC_MAX_CONNECTIONS = 1024  # open connections before new ones get a 503
+ASYNC_MAX_INFLIGHT = 64  # requests running or queued for a worker before new ones get a 503
+ASYNC_HEADER_TIMEOUT = 10  # seconds to receive a new connection's request head
+ASYNC_BODY_TIMEOUT = 30  # seconds to receive a request body
+ASYNC_MAX_BODY = 1024 * 1024  # bytes
+# Multi-process mode (--processes N > 1): this process keeps the config, traffic and upstreams and
+# serves the API on CONTROL_HOST; N forked workers share PORT (SO_REUSEPORT) and render subscriptions
+PROCESSES = int(os.environ.get('SUB_HUB_PROCESSES', 1))
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = int(os.environ.get('SUB_HUB_CONTROL_PORT', 0))  # 0 = any free port
+SHARED_SNAPSHOT_FILE = os.environ.get('SUB_HUB_SNAPSHOT_FILE') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else script_dir, f'sub_hub_{PORT}.snapshot')
+SHARED_SNAPSHOT_CAPACITY = 4 * 1024 * 1024  # bytes mapped up front, doubled if the state outgrows it
+SHARED_PUBLISH_INTERVAL = 0.5  # seconds between checks for new config/traffic/upstream versions
+WORKER_RESPAWN_DELAY = 1  # seconds before a worker that exited is forked again
+WORKER_STATS_INTERVAL = 5  # seconds between a worker's dumps of its counters for /api/stats
+TEMPLATE_CHECK_INTERVAL = 5  # seconds between template mtime checks (SIGHUP reloads at once)
+DIRECT_SCHEMES = ('vless://', 'vmess://', 'ss://')
+UPSTREAM_CACHE_DIR = os.path.join(script_dir, 'upstream_cache')  # last good body of each upstream subscription
+UPSTREAM_TIMEOUT = 10  # seconds
+UPSTREAM_REFRESH = int(os.environ.get('SUB_HUB_UPSTREAM_REFRESH', 600))  # seconds, per-node "refresh_interval" overrides
+UPSTREAM_WORKERS = 4  # upstream sources fetched in parallel
+UPSTREAM_MAX_BYTES = int(os.environ.get('SUB_HUB_UPSTREAM_MAX_BYTES', 8 * 1024 * 1024))  # per body, 0 = no limit
+UPSTREAM_MAX_LINKS = int(os.environ.get('SUB_HUB_UPSTREAM_MAX_LINKS', 5000))  # per source, 0 = no limit
+CONVERT_TTL = 300  # seconds a /convert result stays cached (its sources aren't versioned)
+CONVERT_MAX_SOURCES = 8  # url= entries accepted per /convert request
+CONVERT_CACHE_SIZE = 64  # untracked /convert sources kept parsed in memory (only public addresses are fetched)
+CONVERT_TOKEN = os.environ.get('SUB_HUB_CONVERT_TOKEN')  # if set, /convert requires &token=
+UPSTREAM_BREAKER_THRESHOLD = 3  # failures in a row before a source's circuit opens
+UPSTREAM_BREAKER_BACKOFF = (30, 3600)  # seconds: first backoff, cap (doubles per failed probe)
+# Public IP: SUB_HUB_PUBLIC_IP (env) or "public_ip" in config.json override auto-detection
+PUBLIC_IP_ENV = 'SUB_HUB_PUBLIC_IP'
+PUBLIC_IP_REFRESH = int(os.environ.get('SUB_HUB_IP_REFRESH', 3600))  # seconds, 0 = never
+TRAFFIC_POLL_INTERVAL = int(os.environ.get('SUB_HUB_TRAFFIC_POLL', 10))  # seconds between 3x-ui reads
+TRAFFIC_HISTORY_FILE = os.path.join(script_dir, 'traffic_history.bin')
+# Hard cap on series kept (~30 KB each: 1 day of minutes + 92 days of hours); past it deleted nodes /
+# subscriptions go first, then the idlest live ones (listed under "traffic_history" in /api/stats)
+TRAFFIC_HISTORY_MAX_SERIES = int(os.environ.get('SUB_HUB_HISTORY_MAX_SERIES', 1024))
+TRAFFIC_HISTORY_SAVE_INTERVAL = 300  # seconds
 
 import threading
-CONFIG_LOCK = threading.Lock()
+CONFIG_STORE = open_store(STORAGE_BACKEND, CONFIG_FILE, CONFIG_DB, DURABILITY, FLUSH_DELAY)
+PARSE_CACHE = ParsedNodeCache(ProxyParser.parse, PARSE_CACHE_SIZE)
+RENDER_CACHE = RenderCache(RENDER_CACHE_SIZE)
+STATIC_CACHE = StaticCache()
+
+
+def load_template(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml_io.load(f)
+
+
+TEMPLATES = TemplateCache(load_template, TEMPLATE_CHECK_INTERVAL)
+
+
+def parse_upstream_body(stream):
+    """Proxy dicts from an upstream subscription body, streamed.
+
+    Clash YAML profiles contribute their `proxies` as-is; anything else is
+    read as a base64 or plain link list.
+    """
+    if sniff_clash_yaml(stream):
+        return list(iter_clash_proxies(stream, UPSTREAM_MAX_BYTES, UPSTREAM_MAX_LINKS))
+    nodes = []
+    for link in iter_links(stream, UPSTREAM_MAX_BYTES, UPSTREAM_MAX_LINKS):
+        try:
+            nodes.append(PARSE_CACHE.parse(link))
+        except: pass
+    return nodes
+
+
+UPSTREAM = UpstreamCache(UPSTREAM_CACHE_DIR, UPSTREAM_TIMEOUT, UPSTREAM_MAX_BYTES, parse_upstream_body)
+CONVERT_SOURCES = AdHocSources(parse_upstream_body, CONVERT_CACHE_SIZE, CONVERT_TTL, UPSTREAM_TIMEOUT, UPSTREAM_MAX_BYTES)
+UPSTREAMS = UpstreamScheduler(UPSTREAM, parse_upstream_body, CONFIG_STORE,
+                              lambda url: url.startswith(DIRECT_SCHEMES), UPSTREAM_REFRESH, UPSTREAM_WORKERS,
+                              breaker=lambda: CircuitBreaker(UPSTREAM_BREAKER_THRESHOLD, *UPSTREAM_BREAKER_BACKOFF))
 
 def get_public_ip():
     """获取 VPS 公网 IP"""
@@ -57,102 +163,289 @@ def get_public_ip():
     except:
         return 'your_vps_ip'
 
+class PublicIPResolver:
+    """Caches the VPS public IP so request handlers never hit the network.
+
+    Detection runs once at startup and then in a background thread every
+    `interval` seconds. An env var or config override skips detection while
+    it is set; the thread keeps running so removing it takes effect.
+    """
+
+    def __init__(self, interval=PUBLIC_IP_REFRESH):
+        self.interval = interval
+        self.detected = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def override(self, snap=None):
+        if os.environ.get(PUBLIC_IP_ENV):
+            return os.environ[PUBLIC_IP_ENV]
+        snap = snap or CONFIG_STORE.snapshot()
+        return snap.data.get('public_ip')
+
+    def known(self, snap=None):
+        """Overridden or detected public IP, None while neither is known."""
+        return self.override(snap) or self.detected
+
+    def get(self, snap=None):
+        """Cached public IP (never blocks)."""
+        return self.known(snap) or 'your_vps_ip'
+
+    def refresh(self):
+        ip = get_public_ip()
+        if ip and ip != 'your_vps_ip':
+            self.detected = ip
+
+    def start(self):
+        if not self.override():
+            self.refresh()
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='public-ip', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if not self.override():
+                self.refresh()
+
+PUBLIC_IP = PublicIPResolver()
+
 XUI_DB = '/etc/x-ui/x-ui.db'
+TRAFFIC = TrafficPoller(XUI_DB, CONFIG_STORE, TRAFFIC_POLL_INTERVAL)
+USAGE_LEDGER = UsageLedger(os.path.join(script_dir, 'usage_ledger.json'))
+TRAFFIC.listeners.append(lambda traffic, snap: USAGE_LEDGER.sync(snap, traffic))
+TRAFFIC_HISTORY = TrafficHistory(TRAFFIC_HISTORY_FILE, max_series=TRAFFIC_HISTORY_MAX_SERIES)
+_history_saved_at = [time.time()]
+
+def record_traffic_history(traffic, snap):
+    """Poller listener: sample node and subscription counters into the history rings."""
+    counters = {f"node:{nid}": b for nid, b in traffic.node_bytes.items()}
+    for s in snap.subscriptions:
+        counters[f"sub:{s['id']}"] = USAGE_LEDGER.usage(s['id'])
+    TRAFFIC_HISTORY.record(counters)
+    if time.time() - _history_saved_at[0] >= TRAFFIC_HISTORY_SAVE_INTERVAL:
+        _history_saved_at[0] = time.time()
+        TRAFFIC_HISTORY.save()
 
-def sync_traffic(nodes):
-    """Sync nodes usage from 3x-ui database."""
-    if not os.path.exists(XUI_DB):
-        return nodes
-    
+TRAFFIC.listeners.append(record_traffic_history)
+
+def parse_range(value, default=86400):
+    """'90m' / '24h' / '30d' -> seconds (capped to the hourly history span)."""
+    units = {'m': 60, 'h': 3600, 'd': 86400}
     try:
-        import sqlite3
-        conn = sqlite3.connect(XUI_DB)
-        c = conn.cursor()
-        c.execute('SELECT port, up, down FROM inbounds')
-        db_stats = {str(row[0]): (row[1] + row[2]) for row in c.fetchall()}
-        conn.close()
-        
-        for node in nodes:
-            # Extract port from URL (e.g., :443)
-            try:
-                from urllib.parse import urlparse
-                # For vless/vmess/ss urls
-                u = urlparse(node['url'])
-                port = str(u.port)
-                if port in db_stats:
-                    node['used_bytes'] = db_stats[port]
-            except: pass
-    except Exception as e:
-        print(f"Traffic sync error: {e}")
-    return nodes
+        seconds = int(value[:-1]) * units[value[-1]] if value else default
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid range: {value}")
+    return max(60, min(seconds, TRAFFIC_HISTORY.hour_slots * 3600))
 
-def load_config():
-    with CONFIG_LOCK:
-        default_config = {"nodes": [], "subscriptions": []}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list): # Migrate from v1
-                        data = {"nodes": [{"id": str(i), "name": f"Node {i+1}", "url": u, "limit_gb": 0, "used_bytes": 0, "expiry": None, "chain_with": None} for i, u in enumerate(data)], "subscriptions": []}
-                    if isinstance(data, dict):
-                        if "nodes" not in data: data["nodes"] = []
-                        if "subscriptions" not in data: data["subscriptions"] = []
-                        # Ensure all nodes/subs have necessary traffic fields
-                        for n in data["nodes"]:
-                            if 'used_bytes' not in n: n['used_bytes'] = 0
-                            if 'limit_gb' not in n: n['limit_gb'] = 0
-                        for s in data["subscriptions"]:
-                            if 'used_bytes' not in s: s['used_bytes'] = 0
-                            if 'limit_gb' not in s: s['limit_gb'] = 0
-                            if 'traffic_base' not in s: s['traffic_base'] = {} # map node_id -> base_bytes
-                        return data
-            except Exception as e:
-                print(f"Error loading config: {e}")
-        return default_config
+def sync_traffic(nodes, traffic=None):
+    """Overlay live 3x-ui usage from the traffic poller onto node dicts.
+
+    Returns shallow copies so frozen snapshot nodes can be passed in directly.
+    """
+    node_bytes = (traffic or TRAFFIC.snapshot()).node_bytes
+    synced = []
+    for n in nodes:
+        n = dict(n)
+        if n['id'] in node_bytes:
+            n['used_bytes'] = node_bytes[n['id']]
+        synced.append(n)
+    return synced
+
+def node_used_bytes(node, traffic):
+    """Live usage of one configured node (falls back to the stored counter)."""
+    return traffic.node_bytes.get(node['id'], node.get('used_bytes', 0))
+
+def current_traffic_base(snap, node_ids, traffic=None):
+    """node_id -> current counter, recorded as a subscription's traffic_base."""
+    traffic = traffic or TRAFFIC.snapshot()
+    base = {}
+    for nid in node_ids:
+        node = snap.node(nid)
+        if node:
+            base[nid] = node_used_bytes(node, traffic)
+    return base
+
+def subscription_usage(sub, snap, traffic):
+    """Bytes used by a subscription since its traffic_base, from the usage ledger."""
+    USAGE_LEDGER.sync(snap, traffic)
+    return USAGE_LEDGER.usage(sub['id'])
+
+def shared_state_key():
+    snap = CONFIG_STORE.snapshot()
+    return (snap.version, TRAFFIC.snapshot().version, PUBLIC_IP.get(snap), tuple(UPSTREAMS.versions().items()))
+
+def shared_state():
+    """Everything workers need to render subscriptions, as published to the shared snapshot file."""
+    snap = CONFIG_STORE.snapshot()
+    traffic = TRAFFIC.snapshot()
+    USAGE_LEDGER.sync(snap, traffic)
+    return {
+        "config": {"version": snap.version, "data": snap.data},
+        "traffic": {"version": traffic.version, "port_bytes": dict(traffic.port_bytes),
+                    "node_ports": dict(traffic.node_ports), "taken_at": traffic.taken_at},
+        "usage": USAGE_LEDGER.totals(),
+        "public_ip": PUBLIC_IP.get(snap),
+        "upstreams": UPSTREAMS.versions(),
+    }
+
+SHARED_PUBLISHER = None  # SnapshotPublisher, in the primary of multi-process mode
+PRIMARY_ADDRESS = None  # (host, port) of the primary, in worker processes
+# Not relayed between the client and the primary
+UNFORWARDED_HEADERS = frozenset(('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer',
+                                 'upgrade', 'content-length', 'server', 'date'))
+
+def resolve_template(name):
+    """Path of templates/<name>, falling back to the default template."""
+    template_path = os.path.join(script_dir, 'templates', name or 'base-rules.yaml')
+    if not TEMPLATES.exists(template_path):
+        template_path = LOCAL_TEMPLATE
+    return template_path
 
-def save_config(config):
-    with CONFIG_LOCK:
-        # Use a temporary file for atomic write if possible, or just lock
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
 
 class SubBridgeHandler(BaseHTTPRequestHandler):
+    # Persistent connections: every response carries Content-Length (or is chunked / closes)
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+
+    def handle_one_request(self):
+        # Idle wait for the next request line; parse_request() lifts it once one arrives.
+        # timeout is None under the asyncio engine, which enforces its own.
+        if self.timeout is not None:
+            self.connection.settimeout(KEEPALIVE_TIMEOUT)
+        self.response_started = False
+        self.connection_header = False
+        super().handle_one_request()
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self.timeout is not None:
+            self.connection.settimeout(REQUEST_TIMEOUT)
+        self.requests_served += 1
+        if self.requests_served >= KEEPALIVE_MAX_REQUESTS:
+            self.close_connection = True
+        # Only POST/PUT read a (Content-Length) body; anything left unread would be parsed as the next request
+        try:
+            has_body = int(self.headers.get('Content-Length') or 0) > 0
+        except ValueError:
+            has_body = True
+        if self.headers.get('Transfer-Encoding') or (has_body and self.command not in ('POST', 'PUT')):
+            self.close_connection = True
+        return True
+
+    def send_response(self, code, message=None):
+        self.response_started = True
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self.connection_header = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if not self.connection_header:
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+
+    def send_error(self, code, message=None, explain=None):
+        """Like BaseHTTPRequestHandler.send_error, but 4xx keep the connection open.
+
+        If a response is already under way (e.g. a handler failed halfway
+        through writing), a second one would corrupt the stream, so the
+        connection is dropped instead.
+        """
+        if self.response_started:
+            self.close_connection = True
+            return
+        if code >= 500 or not self.command:
+            super().send_error(code, message, explain)
+            return
+        short, long = self.responses.get(code, ('???', '???'))
+        message = message or short
+        body = (self.error_message_format % {
+            'code': code,
+            'message': html.escape(message, quote=False),
+            'explain': html.escape(explain or long, quote=False),
+        }).encode('UTF-8', 'replace')
+        self.log_error("code %d, message %s", code, message)
+        self.send_response(code, message)
+        self.send_header('Content-Type', self.error_content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
     def do_GET(self):
         try:
             parsed = urlparse(self.path)
             path = parsed.path.strip('/')
             
-            if path == SECRET_PATH:
+            if PRIMARY_ADDRESS and path.startswith("api/"):
+                self.forward_to_primary()
+            elif path == SECRET_PATH:
                 # Default stable sub (legacy)
                 self.generate_and_send_config()
             elif path.startswith("sub/"):
                 # Professional Sub (v3)
                 token = path.split("/")[-1]
                 self.generate_and_send_config(token=token)
+            elif path == "convert":
+                self.convert(parse_qs(parsed.query))
             elif path == "dashboard" or path == "":
                 self.serve_dashboard()
             elif path == "api/nodes":
-                config = load_config()
-                config["nodes"] = sync_traffic(config["nodes"])
-                self.send_json(config["nodes"])
+                snap = CONFIG_STORE.snapshot()
+                params = parse_qs(parsed.query)
+                if 'id' in params:
+                    node = snap.node(params['id'][0])
+                    if node is None:
+                        self.send_error(404, "Node not found")
+                    else:
+                        self.send_json(dict(sync_traffic([node])[0], etag=snap.etag(node)), etag=snap.etag(node))
+                else:
+                    # ETag is over the stored row, so live used_bytes doesn't invalidate it
+                    self.send_json([dict(n, etag=snap.etag(row)) for n, row in zip(sync_traffic(snap.nodes), snap.nodes)])
             elif path == "api/subscriptions":
-                config = load_config()
-                config["nodes"] = sync_traffic(config["nodes"])
-                # Calculate live subscription usage
-                nodes_map = {n['id']: n['used_bytes'] for n in config["nodes"]}
-                for s in config["subscriptions"]:
-                    total_usage = 0
-                    for nid in s.get('node_ids', []):
-                        if nid in nodes_map:
-                            base = s.get('traffic_base', {}).get(nid, 0)
-                            current = nodes_map[nid]
-                            # If current < base, node might have been reset, we treat it as 0 delta or handle reset?
-                            # Simplest: just current if reset, else current - base
-                            delta = max(0, current - base)
-                            total_usage += delta
-                    s['used_bytes'] = total_usage
-                self.send_json(config.get("subscriptions", []))
+                snap = CONFIG_STORE.snapshot()
+                traffic = TRAFFIC.snapshot()
+                params = parse_qs(parsed.query)
+                # Live subscription usage from the ledger (counter resets count as new epochs)
+                if 'id' in params:
+                    s = snap.subscription(params['id'][0])
+                    if s is None:
+                        self.send_error(404, "Subscription not found")
+                    else:
+                        self.send_json(dict(s, used_bytes=subscription_usage(s, snap, traffic), etag=snap.etag(s)), etag=snap.etag(s))
+                else:
+                    subscriptions = [dict(s, used_bytes=subscription_usage(s, snap, traffic), etag=snap.etag(s)) for s in snap.subscriptions]
+                    self.send_json(subscriptions)
+            elif path.startswith("api/traffic/"):
+                self.send_traffic_history(path.split("/", 2)[2], parse_qs(parsed.query))
+            elif path == "api/upstreams":
+                snap = CONFIG_STORE.snapshot()
+                statuses = UPSTREAMS.status()
+                for status in statuses:
+                    status["node_ids"] = [n["id"] for n in snap.nodes if n["url"] == status["url"]]
+                self.send_json(statuses)
+            elif path == "api/stats":
+                stats = dict(process_stats(self.server), traffic_history=TRAFFIC_HISTORY.stats(),
+                             shared=SHARED_PUBLISHER.stats() if SHARED_PUBLISHER else None)
+                if SHARED_PUBLISHER:
+                    # /api/* is relayed to the primary; the workers that render report their own counters
+                    stats["scope"] = "primary"
+                    stats["workers"] = read_worker_stats()
+                self.send_json(stats)
             elif path == "health":
                 self.send_response(200)
                 self.send_header('Content-Length', '2')
@@ -167,16 +460,13 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
             else:
                 # Try to serve static file if it exists (e.g. css, js, fonts)
                 file_path = os.path.join(os.path.dirname(__file__), path)
-                if os.path.exists(file_path) and os.path.isfile(file_path):
-                    with open(file_path, 'rb') as f:
-                        content = f.read()
-                    self.send_response(200)
-                    if path.endswith('.css'): self.send_header('Content-Type', 'text/css')
-                    elif path.endswith('.js'): self.send_header('Content-Type', 'application/javascript')
-                    elif path.endswith('.woff2'): self.send_header('Content-Type', 'font/woff2')
-                    else: self.send_header('Content-Type', 'application/octet-stream')
-                    self.end_headers()
-                    self.wfile.write(content)
+                static = STATIC_CACHE.get(file_path) if os.path.isfile(file_path) else None
+                if static is not None:
+                    if path.endswith('.css'): content_type = 'text/css'
+                    elif path.endswith('.js'): content_type = 'application/javascript'
+                    elif path.endswith('.woff2'): content_type = 'font/woff2'
+                    else: content_type = 'application/octet-stream'
+                    self.send_body(static.body, content_type, variants=static.variants)
                 else:
                     self.send_error(404, "Not Found")
         except Exception as e:
@@ -184,30 +474,33 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
             self.send_error(500, str(e))
 
     def do_POST(self):
+        if PRIMARY_ADDRESS:
+            self.forward_to_primary()
+            return
         content_length = int(self.headers.get('Content-Length', 0))
         body = self.rfile.read(content_length).decode('utf-8')
         
         parsed = urlparse(self.path)
         path = parsed.path.strip('/')
+        params = parse_qs(parsed.query)
 
         if path == "api/nodes":
             try:
                 data = json.loads(body)
                 url = data.get('url')
                 if url:
-                    config = load_config()
+                    snap = CONFIG_STORE.snapshot()
                     # Determine name
                     name = data.get('name')
                     if not name:
                         name = "新节点"
                         if '://' in url:
                             try:
-                                temp_node = ProxyParser.parse(url)
+                                temp_node = PARSE_CACHE.parse(url)
                                 name = temp_node.get('name', '新节点')
                             except: pass
                     
                     new_node = {
-                        "id": str(int(time.time())),
                         "name": name,
                         "url": url,
                         "limit_gb": data.get('limit_gb', 0),
@@ -215,8 +508,8 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                         "expiry": data.get('expiry'),
                         "chain_with": data.get('chain_with')
                     }
-                    config["nodes"].append(new_node)
-                    save_config(config)
+                    CONFIG_STORE.insert_node(new_node)
+                    UPSTREAMS.wake()
                     self.send_json({"status": "ok"})
                 else:
                     self.send_error(400, "Missing URL")
@@ -226,21 +519,16 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
         elif path == "api/subscriptions":
             try:
                 data = json.loads(body)
-                config = load_config()
-                config["nodes"] = sync_traffic(config["nodes"])
+                snap = CONFIG_STORE.snapshot()
                 
                 import random, string
                 token = ''.join(random.choices(string.ascii_letters + string.digits, k=16))
                 
                 # Record current node traffic as base for this subscription
                 node_ids = data.get('node_ids', [])
-                traffic_base = {}
-                for n in config["nodes"]:
-                    if n['id'] in node_ids:
-                        traffic_base[n['id']] = n.get('used_bytes', 0)
+                traffic_base = current_traffic_base(snap, node_ids)
                 
                 new_sub = {
-                    "id": str(int(time.time())),
                     "name": data.get('name', '未命名订阅'),
                     "token": token,
                     "node_ids": node_ids,
@@ -255,8 +543,7 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                     new_sub['external_proxy'] = data['external_proxy']
                 if data.get('template'):
                     new_sub['template'] = data['template']
-                config["subscriptions"].append(new_sub)
-                save_config(config)
+                CONFIG_STORE.insert_subscription(new_sub)
                 self.send_json({"status": "ok", "token": token})
             except Exception as e:
                 self.send_error(500, str(e))
@@ -271,20 +558,15 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                 
                 if output_format == 'clash':
                     # Generate a temporary Sub Hub subscription for selected nodes
-                    config = load_config()
+                    snap = CONFIG_STORE.snapshot()
                     token = generate_random_string(16)
                     expiry_date = time.strftime('%Y-%m-%d', time.localtime(time.time() + duration_hours * 3600))
                     
                     # Calculate traffic base for delta tracking
-                    traffic_base = {}
-                    for nid in selected_node_ids:
-                        node = next((n for n in config["nodes"] if n["id"] == nid), None)
-                        if node:
-                            traffic_base[nid] = node.get('used_bytes', 0)
+                    traffic_base = current_traffic_base(snap, selected_node_ids)
                     
                     guest_name = data.get('name') or f"Guest-{duration_hours}h"
                     guest_sub = {
-                        "id": str(int(time.time() * 1000)),
                         "name": guest_name,
                         "token": token,
                         "node_ids": selected_node_ids,
@@ -295,16 +577,19 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                         "is_guest": True,
                         "traffic_base": traffic_base
                     }
-                    config["subscriptions"].append(guest_sub)
-                    save_config(config)
+                    CONFIG_STORE.insert_subscription(guest_sub, scale=1000)
                     
-                    public_ip = get_public_ip()
+                    public_ip = PUBLIC_IP.get(snap)
                     clash_url = f"http://{public_ip}:{PORT}/sub/{token}"
                     self.send_json({"status": "ok", "link": clash_url, "format": "clash", "expiry": expiry_date})
                 else:
                     # Original SS link via guest_pass.py
                     cmd = [sys.executable, os.path.join(script_dir, 'guest_pass.py'), str(duration_hours), str(total_gb)]
-                    result = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+                    env = dict(os.environ)
+                    public_ip = PUBLIC_IP.known()
+                    if public_ip:  # Unset, guest_pass.py detects it itself rather than embedding a placeholder
+                        env[PUBLIC_IP_ENV] = public_ip
+                    result = subprocess.check_output(cmd, stderr=subprocess.STDOUT, env=env).decode('utf-8')
                     
                     import re
                     match = re.search(r'(ss://[^\s]+)', result)
@@ -317,27 +602,19 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
         elif path == "api/subscriptions/reset":
             try:
                 sub_id = params.get('id', [None])[0]
-                config = load_config()
-                config["nodes"] = sync_traffic(config["nodes"])
-                
-                found = False
-                for s in config["subscriptions"]:
-                    if s["id"] == sub_id:
-                        # Update traffic_base to current node traffic
-                        new_base = {}
-                        for n in config["nodes"]:
-                            if n['id'] in s.get('node_ids', []):
-                                new_base[n['id']] = n.get('used_bytes', 0)
-                        s['traffic_base'] = new_base
-                        s['used_bytes'] = 0
-                        found = True
-                        break
-                
-                if found:
-                    save_config(config)
-                    self.send_json({"status": "ok"})
-                else:
-                    self.send_error(404, "Subscription not found")
+                snap = CONFIG_STORE.snapshot()
+
+                def reset(s):
+                    # Update traffic_base to current node traffic
+                    s['traffic_base'] = current_traffic_base(snap, s.get('node_ids', []))
+                    s['used_bytes'] = 0
+
+                new_snap = CONFIG_STORE.update_subscription(sub_id, reset, self.headers.get('If-Match'))
+                self.send_json({"status": "ok"}, etag=new_snap.etag(new_snap.subscription(sub_id)))
+            except KeyError:
+                self.send_error(404, "Subscription not found")
+            except ConflictError:
+                self.send_error(412, "Subscription was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
         elif path == "api/subscriptions/extend":
@@ -346,38 +623,38 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                 sub_id = data.get('id')
                 extend_hours = float(data.get('extend_hours', 24))
                 
-                config = load_config()
-                found = False
-                for s in config["subscriptions"]:
-                    if s["id"] == sub_id:
-                        # Calculate new expiry
-                        current_expiry = s.get('expiry')
-                        if current_expiry:
-                            try:
-                                expire_date = time.strptime(current_expiry, "%Y-%m-%d")
-                                expire_ts = time.mktime(expire_date)
-                            except:
-                                expire_ts = time.time()
-                        else:
+                def extend(s):
+                    # Calculate new expiry
+                    current_expiry = s.get('expiry')
+                    if current_expiry:
+                        try:
+                            expire_date = time.strptime(current_expiry, "%Y-%m-%d")
+                            expire_ts = time.mktime(expire_date)
+                        except:
                             expire_ts = time.time()
-                        
-                        # Add extension hours
-                        new_expire_ts = expire_ts + (extend_hours * 3600)
-                        s['expiry'] = time.strftime("%Y-%m-%d", time.localtime(new_expire_ts))
-                        found = True
-                        break
-                
-                if found:
-                    save_config(config)
-                    self.send_json({"status": "ok", "new_expiry": s['expiry']})
-                else:
-                    self.send_error(404, "Subscription not found")
+                    else:
+                        expire_ts = time.time()
+                    
+                    # Add extension hours
+                    new_expire_ts = expire_ts + (extend_hours * 3600)
+                    s['expiry'] = time.strftime("%Y-%m-%d", time.localtime(new_expire_ts))
+
+                new_snap = CONFIG_STORE.update_subscription(sub_id, extend, self.headers.get('If-Match'))
+                s = new_snap.subscription(sub_id)
+                self.send_json({"status": "ok", "new_expiry": s['expiry']}, etag=new_snap.etag(s))
+            except KeyError:
+                self.send_error(404, "Subscription not found")
+            except ConflictError:
+                self.send_error(412, "Subscription was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
         else:
             self.send_error(404, "Not Found")
 
     def do_PUT(self):
+        if PRIMARY_ADDRESS:
+            self.forward_to_primary()
+            return
         parsed = urlparse(self.path)
         path = parsed.path.strip('/')
         params = parse_qs(parsed.query)
@@ -386,111 +663,235 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
 
         if path == "api/nodes":
             try:
-                index = int(params.get('index', [-1])[0])
-                config = load_config()
-                if 0 <= index < len(config["nodes"]):
-                    data = json.loads(body)
-                    node = config["nodes"][index]
+                node_id = self.node_id_param(params)
+                if node_id is None:
+                    self.send_error(400, "Invalid index")
+                    return
+                data = json.loads(body)
+
+                def update(node):
                     node["name"] = data.get("name", node["name"])
                     node["url"] = data.get("url", node["url"])
                     node["limit_gb"] = data.get("limit_gb", node["limit_gb"])
                     node["expiry"] = data.get("expiry", node["expiry"])
                     node["chain_with"] = data.get("chain_with", node["chain_with"])
-                    save_config(config)
-                    self.send_json({"status": "ok"})
-                else:
-                    self.send_error(400, "Invalid index")
+
+                new_snap = CONFIG_STORE.update_node(node_id, update, self.headers.get('If-Match'))
+                UPSTREAMS.wake()
+                self.send_json({"status": "ok"}, etag=new_snap.etag(new_snap.node(node_id)))
+            except KeyError:
+                self.send_error(404, "Node not found")
+            except ConflictError:
+                self.send_error(412, "Node was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
         
         elif path == "api/subscriptions":
             try:
                 sub_id = params.get('id', [None])[0]
-                config = load_config()
-                found = False
-                for s in config["subscriptions"]:
-                    if s["id"] == sub_id:
-                        data = json.loads(body)
-                        s["name"] = data.get("name", s["name"])
-                        s["node_ids"] = data.get("node_ids", s["node_ids"])
-                        s["limit_gb"] = data.get("limit_gb", s.get("limit_gb", 0))
-                        s["expiry"] = data.get("expiry", s.get("expiry"))
-                        s["status"] = data.get("status", s.get("status", "active"))
-                        # Support external proxy for chain
-                        if "external_proxy" in data:
-                            s["external_proxy"] = data["external_proxy"]
-                        if "chains" in data:
-                            s["chains"] = data["chains"]
-                        if "dialer_id" in data:
-                            s["dialer_id"] = data["dialer_id"]
-                        if "dialer_name" in data:
-                            s["dialer_name"] = data["dialer_name"]
-                        if "template" in data:
-                            s["template"] = data["template"]
-                        found = True
-                        break
-                if found:
-                    save_config(config)
-                    self.send_json({"status": "ok"})
-                else:
-                    self.send_error(404, "Subscription not found")
+                data = json.loads(body)
+
+                def update(s):
+                    s["name"] = data.get("name", s["name"])
+                    s["node_ids"] = data.get("node_ids", s["node_ids"])
+                    s["limit_gb"] = data.get("limit_gb", s.get("limit_gb", 0))
+                    s["expiry"] = data.get("expiry", s.get("expiry"))
+                    s["status"] = data.get("status", s.get("status", "active"))
+                    # Support external proxy for chain
+                    if "external_proxy" in data:
+                        s["external_proxy"] = data["external_proxy"]
+                    if "chains" in data:
+                        s["chains"] = data["chains"]
+                    if "dialer_id" in data:
+                        s["dialer_id"] = data["dialer_id"]
+                    if "dialer_name" in data:
+                        s["dialer_name"] = data["dialer_name"]
+                    if "template" in data:
+                        s["template"] = data["template"]
+
+                new_snap = CONFIG_STORE.update_subscription(sub_id, update, self.headers.get('If-Match'))
+                self.send_json({"status": "ok"}, etag=new_snap.etag(new_snap.subscription(sub_id)))
+            except KeyError:
+                self.send_error(404, "Subscription not found")
+            except ConflictError:
+                self.send_error(412, "Subscription was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
+        else:
+            self.send_error(404, "Not Found")
 
     def do_DELETE(self):
+        if PRIMARY_ADDRESS:
+            self.forward_to_primary()
+            return
         parsed = urlparse(self.path)
         path = parsed.path.strip('/')
         params = parse_qs(parsed.query)
 
+        if_match = self.headers.get('If-Match')
+
         if path == "api/nodes":
             try:
-                index = int(params.get('index', [-1])[0])
-                config = load_config()
-                if 0 <= index < len(config["nodes"]):
-                    config["nodes"].pop(index)
-                    save_config(config)
-                    self.send_json({"status": "ok"})
-                else:
+                node_id = self.node_id_param(params)
+                if node_id is None:
                     self.send_error(400, "Invalid index")
+                    return
+                CONFIG_STORE.remove_node(node_id, if_match)
+                self.send_json({"status": "ok"})
+            except KeyError:
+                self.send_error(404, "Node not found")
+            except ConflictError:
+                self.send_error(412, "Node was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
                 
         elif path == "api/subscriptions":
             try:
                 sub_id = params.get('id', [None])[0]
-                config = load_config()
-                config["subscriptions"] = [s for s in config["subscriptions"] if s["id"] != sub_id]
-                save_config(config)
+                try:
+                    CONFIG_STORE.remove_subscription(sub_id, if_match)
+                except KeyError:
+                    # Deleting a missing subscription is fine, unless the client expected a version of it
+                    if if_match:
+                        raise ConflictError(sub_id)
                 self.send_json({"status": "ok"})
+            except ConflictError:
+                self.send_error(412, "Subscription was modified, reload and retry")
             except Exception as e:
                 self.send_error(500, str(e))
+        else:
+            self.send_error(404, "Not Found")
+
+    def node_id_param(self, params):
+        """Node id from ?id=, or from the legacy ?index= position (guard those with If-Match)."""
+        if 'id' in params:
+            return params['id'][0]
+        try:
+            index = int(params.get('index', [-1])[0])
+        except ValueError:
+            return None
+        nodes = CONFIG_STORE.snapshot().nodes
+        if 0 <= index < len(nodes):
+            return nodes[index]["id"]
+        return None
+
+    def send_traffic_history(self, item_id, params):
+        """GET /api/traffic/<node or subscription id>?range=24h&points=120[&kind=node|sub]"""
+        try:
+            seconds = parse_range(params.get('range', [''])[0])
+            max_points = max(1, min(int(params.get('points', ['120'])[0]), 2000))
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        snap = CONFIG_STORE.snapshot()
+        kind = params.get('kind', [None])[0]
+        if kind is None:
+            kind = 'node' if snap.node(item_id) else 'sub'
+        if kind == 'node':
+            item = snap.node(item_id)
+        elif kind == 'sub':
+            item = snap.subscription(item_id)
+        else:
+            self.send_error(400, "kind must be node or sub")
+            return
+        if item is None:
+            self.send_error(404, "Not Found")
+            return
+        key = f"{kind}:{item_id}"
+        result = TRAFFIC_HISTORY.query(key, seconds, max_points) or {
+            "step": 60 if seconds <= 86400 else 3600, "points": [], "total": 0, "rate_bps": 0, "avg_bps": 0}
+        result.update({"id": item_id, "kind": kind, "range": seconds, "history_dropped": TRAFFIC_HISTORY.is_dropped(key)})
+
+        # Projected quota exhaustion from the last day's average rate
+        traffic = TRAFFIC.snapshot()
+        used = subscription_usage(item, snap, traffic) if kind == 'sub' else node_used_bytes(item, traffic)
+        limit = int(item.get('limit_gb', 0) * (1024**3))
+        result["used_bytes"] = used
+        result["limit_bytes"] = limit
+        result["projected_exhaustion"] = None
+        if limit > 0:
+            day = TRAFFIC_HISTORY.query(f"{kind}:{item_id}", 86400, 1)
+            if used >= limit:
+                result["projected_exhaustion"] = int(time.time())
+            elif day and day["avg_bps"] > 0:
+                result["projected_exhaustion"] = int(time.time() + (limit - used) / day["avg_bps"])
+        self.send_json(result)
+
+    def forward_to_primary(self):
+        """Relay an API request to the primary process, which owns every write (multi-process mode)."""
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in UNFORWARDED_HEADERS}
+        headers['X-Forwarded-For'] = self.client_address[0] if self.client_address else ''
+        conn = http.client.HTTPConnection(*PRIMARY_ADDRESS, timeout=REQUEST_TIMEOUT)
+        try:
+            conn.request(self.command, self.path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.send_error(502, f"Primary process unavailable: {e}")
+            return
+        finally:
+            conn.close()
+        self.send_response(response.status, response.reason)
+        for keyword, value in response.getheaders():
+            if keyword.lower() not in UNFORWARDED_HEADERS:
+                self.send_header(keyword, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+        except BrokenPipeError:
+            pass
 
     def serve_dashboard(self):
-        if os.path.exists(DASHBOARD_FILE):
-            with open(DASHBOARD_FILE, 'rb') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.send_header('Content-Length', str(len(content)))
-            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Expires', '0')
-            self.end_headers()
-            try:
-                self.wfile.write(content)
-                self.wfile.flush()
-            except BrokenPipeError:
-                pass
+        dashboard = STATIC_CACHE.get(DASHBOARD_FILE)
+        if dashboard is not None:
+            self.send_body(dashboard.body, 'text/html; charset=utf-8', [
+                ('Cache-Control', 'no-store, no-cache, must-revalidate'),
+                ('Pragma', 'no-cache'),
+                ('Expires', '0'),
+            ], variants=dashboard.variants)
         else:
             self.send_error(404, "Dashboard file not found")
 
-    def send_json(self, data):
+    def send_json(self, data, etag=None):
         body = json.dumps(data).encode('utf-8')
+        # Per-row ETags are for If-Match, so they stay the same whatever the encoding
+        self.send_body(body, 'application/json; charset=utf-8', [
+            ('ETag', etag),
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'no-cache'),
+        ])
+
+    def content_encoding(self, body, content_type):
+        """(encoding or None, negotiable): what Accept-Encoding picks for this body."""
+        negotiable = len(body) >= COMPRESS_MIN_SIZE and compressible(content_type)
+        return (negotiate(self.headers.get('Accept-Encoding')) if negotiable else None), negotiable
+
+    def send_body(self, body, content_type, headers=(), variants=None, etag=None):
+        """Send a 200 with body, compressed when the client accepts it and it's big enough.
+
+        variants (compression.Variants) supplies precompressed copies of a
+        cached body; otherwise the body is compressed for this response.
+        etag is the identity ETag; each encoding gets its own.
+        """
+        encoding, negotiable = self.content_encoding(body, content_type)
+        if encoding:
+            body = variants.get(encoding) if variants is not None else encode(body, encoding)
         self.send_response(200)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Type', content_type)
         self.send_header('Content-Length', str(len(body)))
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Cache-Control', 'no-cache')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if negotiable:
+            self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', encoded_etag(etag, encoding))
+        for name, value in headers:
+            if value:
+                self.send_header(name, value)
         self.end_headers()
         try:
             self.wfile.write(body)
@@ -498,21 +899,20 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
         except BrokenPipeError:
             pass
 
-    def fetch_all_nodes(self, node_ids_filter=None):
+    def fetch_all_nodes(self, node_ids_filter=None, snap=None):
         """Fetches and parses all configured nodes, optionally filtering by ID."""
         all_parsed_nodes = []
-        config = load_config()
-        public_ip = get_public_ip()
+        if snap is None:
+            snap = CONFIG_STORE.snapshot()
+        public_ip = PUBLIC_IP.get(snap)
+        node_confs = snap.nodes if node_ids_filter is None else snap.select_nodes(node_ids_filter)
         
-        for node_conf in config.get("nodes", []):
-            if node_ids_filter is not None and node_conf["id"] not in node_ids_filter:
-                continue
-                
+        for node_conf in node_confs:
             sub_url = node_conf["url"]
             try:
                 # 1. Direct Node Link
-                if sub_url.startswith(('vless://', 'vmess://', 'ss://')):
-                    node = ProxyParser.parse(sub_url)
+                if sub_url.startswith(DIRECT_SCHEMES):
+                    node = PARSE_CACHE.parse(sub_url)
                     node['name'] = node_conf.get('name', node.get('name', 'node'))
                     node['managed_id'] = node_conf['id']
                     node['chain_with'] = node_conf.get('chain_with')
@@ -520,41 +920,159 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                     all_parsed_nodes.append(node)
                     continue
 
-                # 2. Subscription URL
-                with urllib.request.urlopen(sub_url, timeout=10) as response:
-                    content = response.read().decode('utf-8')
-                    try:
-                        decoded = base64.b64decode(content + '==').decode('utf-8')
-                        links = decoded.strip().split('\n')
-                    except:
-                        links = content.strip().split('\n')
-                    
-                    for link in links:
-                        if '://' in link.strip():
-                            try:
-                                node = ProxyParser.parse(link.strip())
-                                node['managed_id'] = node_conf['id']
-                                node['chain_with'] = node_conf.get('chain_with')
-                                if node.get('server') == '127.0.0.1': node['server'] = public_ip
-                                all_parsed_nodes.append(node)
-                            except: pass
+                # 2. Subscription URL (nodes from the last background refresh, no network here)
+                _, upstream_nodes = UPSTREAMS.nodes(sub_url)
+                for upstream_node in upstream_nodes:
+                    node = clone(upstream_node)
+                    node['managed_id'] = node_conf['id']
+                    node['chain_with'] = node_conf.get('chain_with')
+                    if node.get('server') == '127.0.0.1': node['server'] = public_ip
+                    all_parsed_nodes.append(node)
             except Exception as e:
                 print(f"Error fetching source {sub_url}: {e}")
         return all_parsed_nodes
 
+    def build_profile(self, nodes, current_sub, template_path):
+        """The Clash profile as YAML bytes."""
+        return yaml_io.dump(self.assemble_profile(nodes, current_sub, template_path)).encode('utf-8')
+
+    def stream_profile(self, nodes, current_sub, template_path):
+        """The Clash profile as YAML text fragments, proxies and groups one item at a time."""
+        template_version = TEMPLATES.version(template_path)
+        config_yaml = self.assemble_profile(nodes, current_sub, template_path)
+
+        def fragment(key, value):
+            # Keys outside STREAM_KEYS are the template's own, serialized once per template version
+            if key not in STREAM_KEYS and TEMPLATES.exists(template_path) and TEMPLATES.version(template_path) == template_version:
+                return TEMPLATES.fragment(template_path, key, lambda v: yaml_io.dump({key: v}))
+            return yaml_io.dump({key: value})
+
+        return yaml_io.iter_dump(config_yaml, STREAM_KEYS, fragment)
+
+    def assemble_profile(self, nodes, current_sub, template_path):
+        """Merge parsed nodes (and the subscription's chains) into the template."""
+        # Template (parsed once, copied per render)
+        config_yaml = TEMPLATES.get(template_path)
+        if config_yaml is None:
+            config_yaml = {
+                "port": 7890, "socks-port": 7891, "mode": "rule",
+                "dns": {"enable": True, "enhanced-mode": "fake-ip", "nameserver": ["119.29.29.29"]},
+                "proxy-groups": [{"name": "🚀 代理选择", "type": "select", "proxies": []}],
+                "rules": ["MATCH,🚀 代理选择"]
+            }
+
+        # Support both legacy 'external_proxy' and new 'chains' list
+        chains_data = []
+        if current_sub:
+            if current_sub.get('chains'):
+                chains_data = current_sub['chains']
+            elif current_sub.get('external_proxy'):
+                # Convert legacy format to chains list
+                legacy_ext = dict(current_sub['external_proxy'])
+                if 'name' not in legacy_ext:
+                    legacy_ext['name'] = "🇺🇸 运营专线 (美国静态)"
+                if 'dialer_id' not in legacy_ext:
+                    legacy_ext['dialer_id'] = current_sub.get('dialer_id')
+                if 'dialer_name' not in legacy_ext:
+                    legacy_ext['dialer_name'] = current_sub.get('dialer_name')
+                chains_data = [legacy_ext]
+        
+        # Landing proxies go in front of the managed ones and take part in later dialer lookups
+        index = ProxyIndex(nodes)
+        for chain_conf in reversed(chains_data):
+            if chain_conf.get('server') and chain_conf.get('port'):
+                # Find the dialer node
+                dialer_node_name = None
+                
+                # 1. Check for explicit dialer_id in chain or sub
+                target_dialer_id = chain_conf.get('dialer_id') or current_sub.get('dialer_id')
+                if target_dialer_id:
+                    dialer_node_name = index.with_id(target_dialer_id)
+                
+                # 2. Check for explicit dialer_name in chain or sub
+                target_dialer_name = chain_conf.get('dialer_name') or current_sub.get('dialer_name')
+                if not dialer_node_name and target_dialer_name:
+                    dialer_node_name = index.name_contains(target_dialer_name, ignore_case=True)
+
+                # 3. Fallback to DMIT (legacy behavior)
+                if not dialer_node_name:
+                    dialer_node_name = index.name_contains('DMIT')
+                
+                # 4. Final fallback to first node
+                if not dialer_node_name:
+                    dialer_node_name = index.first()
+
+                ext_proxy = {
+                    "name": chain_conf.get('name', "🛸 运营专线"),
+                    "type": chain_conf.get('type', 'socks5'),
+                    "server": chain_conf['server'],
+                    "port": int(chain_conf['port']),
+                }
+                if chain_conf.get('username'):
+                    ext_proxy['username'] = chain_conf['username']
+                    ext_proxy['password'] = chain_conf.get('password', '')
+                
+                # Chain: Client -> Dialer -> External IP -> Target
+                if dialer_node_name:
+                    ext_proxy['dialer-proxy'] = dialer_node_name
+                    
+                index.add_front(ext_proxy)
+        
+        # Injected Managed Proxies (landing IPs first for operators)
+        config_yaml['proxies'] = proxies = index.all()
+        proxy_names = [p['name'] for p in proxies]
+
+        # Handle Relay / Chaining
+        relays = build_relays(proxies, set(proxy_names))
+        if relays:
+            if 'proxy-groups' not in config_yaml: config_yaml['proxy-groups'] = []
+            config_yaml['proxy-groups'].extend(relays)
+        
+        # Update ALL proxy-groups
+        assemble_groups(config_yaml.get('proxy-groups', []), proxy_names, [r['name'] for r in relays])
+
+        return config_yaml
+
+    def subscription_userinfo(self, snap, traffic, current_sub, node_ids_filter):
+        """Subscription-Userinfo header value (live traffic, so not part of the cached body)."""
+        total_limit_bytes = 0
+        used_bytes = 0
+        earliest_expiry = 0
+        
+        if current_sub:
+            # Use Plan-specific stats for header
+            used_bytes = subscription_usage(current_sub, snap, traffic)
+            total_limit_bytes = int(current_sub.get('limit_gb', 0) * (1024**3))
+        else:
+            # Aggregate from nodes (fallback)
+            filtered_node_confs = snap.nodes if node_ids_filter is None else snap.select_nodes(node_ids_filter)
+            for n in filtered_node_confs:
+                total_limit_bytes += (n.get('limit_gb', 0) * (1024**3))
+                used_bytes += node_used_bytes(n, traffic)
+                if n.get('expiry'):
+                    try:
+                        ts = int(time.mktime(time.strptime(n['expiry'], "%Y-%m-%d")))
+                        if earliest_expiry == 0 or ts < earliest_expiry: earliest_expiry = ts
+                    except: pass
+        
+        if current_sub and current_sub.get("expiry"):
+            sub_ts = int(time.mktime(time.strptime(current_sub['expiry'], "%Y-%m-%d")))
+            if earliest_expiry == 0 or sub_ts < earliest_expiry: earliest_expiry = sub_ts
+        
+        return f"upload=0; download={used_bytes}; total={total_limit_bytes}; expire={earliest_expiry}"
+
     def generate_and_send_config(self, token=None):
         try:
-            config = load_config()
+            snap = CONFIG_STORE.snapshot()
+            traffic = TRAFFIC.snapshot()
             node_ids_filter = None
             current_sub = None
             
             if token:
                 # Find the subscription
-                for s in config.get("subscriptions", []):
-                    if s["token"] == token:
-                        current_sub = s
-                        node_ids_filter = s.get("node_ids", [])
-                        break
+                current_sub = snap.subscription_by_token(token)
+                if current_sub:
+                    node_ids_filter = current_sub.get("node_ids", [])
                 
                 if not current_sub:
                     self.send_error(403, "Invalid subscription token.")
@@ -569,194 +1087,160 @@ class SubBridgeHandler(BaseHTTPRequestHandler):
                         
                 # Check Traffic Limit (Plan level)
                 if current_sub.get("limit_gb", 0) > 0:
-                    # Calculate live usage for this sub
-                    nodes_map = {n['id']: n['used_bytes'] for n in config["nodes"]}
-                    sub_usage = 0
-                    for nid in current_sub.get('node_ids', []):
-                        if nid in nodes_map:
-                            base = current_sub.get('traffic_base', {}).get(nid, 0)
-                            sub_usage += max(0, nodes_map[nid] - base)
+                    sub_usage = subscription_usage(current_sub, snap, traffic)
                     if sub_usage >= current_sub["limit_gb"] * (1024**3):
                         self.send_error(403, "Subscription traffic limit exceeded.")
                         return
 
-            nodes = self.fetch_all_nodes(node_ids_filter=node_ids_filter)
-            if not nodes:
-                self.send_error(500, "No nodes available for this subscription.")
-                return
-
-            from socketserver import ThreadingMixIn
             # Load template
-            template_name = current_sub.get('template', 'base-rules.yaml') if current_sub else 'base-rules.yaml'
-            template_path = os.path.join(script_dir, 'templates', template_name)
-            if not os.path.exists(template_path):
-                template_path = LOCAL_TEMPLATE
-
-            if os.path.exists(template_path):
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    config_yaml = yaml.safe_load(f)
-            else:
-                config_yaml = {
-                    "port": 7890, "socks-port": 7891, "mode": "rule",
-                    "dns": {"enable": True, "enhanced-mode": "fake-ip", "nameserver": ["119.29.29.29"]},
-                    "proxy-groups": [{"name": "🚀 代理选择", "type": "select", "proxies": []}],
-                    "rules": ["MATCH,🚀 代理选择"]
-                }
+            template_path = resolve_template(current_sub.get('template') if current_sub else None)
 
-            # Injected Managed Proxies
-            config_yaml['proxies'] = nodes
-            
-            # Support both legacy 'external_proxy' and new 'chains' list
-            chains_data = []
-            if current_sub:
-                if current_sub.get('chains'):
-                    chains_data = current_sub['chains']
-                elif current_sub.get('external_proxy'):
-                    # Convert legacy format to chains list
-                    legacy_ext = current_sub['external_proxy']
-                    if 'name' not in legacy_ext:
-                        legacy_ext['name'] = "🇺🇸 运营专线 (美国静态)"
-                    if 'dialer_id' not in legacy_ext:
-                        legacy_ext['dialer_id'] = current_sub.get('dialer_id')
-                    if 'dialer_name' not in legacy_ext:
-                        legacy_ext['dialer_name'] = current_sub.get('dialer_name')
-                    chains_data = [legacy_ext]
-            
-            for chain_conf in reversed(chains_data):
-                if chain_conf.get('server') and chain_conf.get('port'):
-                    # Find the dialer node
-                    dialer_node_name = None
-                    
-                    # 1. Check for explicit dialer_id in chain or sub
-                    target_dialer_id = chain_conf.get('dialer_id') or current_sub.get('dialer_id')
-                    if target_dialer_id:
-                        for node in nodes:
-                            if node.get('managed_id') == target_dialer_id:
-                                dialer_node_name = node['name']
-                                break
-                    
-                    # 2. Check for explicit dialer_name in chain or sub
-                    target_dialer_name = chain_conf.get('dialer_name') or current_sub.get('dialer_name')
-                    if not dialer_node_name and target_dialer_name:
-                        for node in nodes:
-                            if target_dialer_name.lower() in node['name'].lower():
-                                dialer_node_name = node['name']
-                                break
-
-                    # 3. Fallback to DMIT (legacy behavior)
-                    if not dialer_node_name:
-                        for node in nodes:
-                            if 'DMIT' in node['name']:
-                                dialer_node_name = node['name']
-                                break
-                    
-                    # 4. Final fallback to first node
-                    if not dialer_node_name and nodes:
-                        dialer_node_name = nodes[0]['name']
-
-                    ext_proxy = {
-                        "name": chain_conf.get('name', "🛸 运营专线"),
-                        "type": chain_conf.get('type', 'socks5'),
-                        "server": chain_conf['server'],
-                        "port": int(chain_conf['port']),
-                    }
-                    if chain_conf.get('username'):
-                        ext_proxy['username'] = chain_conf['username']
-                        ext_proxy['password'] = chain_conf.get('password', '')
-                    
-                    # Chain: Client -> Dialer -> External IP -> Target
-                    if dialer_node_name:
-                        ext_proxy['dialer-proxy'] = dialer_node_name
-                        
-                    config_yaml['proxies'].insert(0, ext_proxy)
-            
-            # Handle Relay / Chaining
-            external_proxy_names = [p['name'] for p in config_yaml['proxies'] if p['name'] not in [n['name'] for n in nodes]]
-            managed_node_names = [n['name'] for n in nodes]
-            relay_names = []
-            relays = []
-            for node in nodes:
-                if node.get('chain_with'):
-                    target_name = node['chain_with']
-                    if target_name in managed_node_names:
-                        relay_name = f"🔗 {node['name']} -> {target_name}"
-                        relays.append({
-                            "name": relay_name,
-                            "type": "relay",
-                            "proxies": [target_name, node['name']]
-                        })
-            
-            if relays:
-                if 'proxy-groups' not in config_yaml: config_yaml['proxy-groups'] = []
-                config_yaml['proxy-groups'].extend(relays)
-            
-            # Update ALL proxy-groups
-            relay_names = [r['name'] for r in relays]
-            # Prioritize landing IPs for operators
-            select_proxies = external_proxy_names + managed_node_names + relay_names
-            for group in config_yaml.get('proxy-groups', []):
-                group_type = group.get('type', '')
-                if group_type == 'url-test':
-                    current = group.get('proxies', [])
-                    for name in managed_node_names + external_proxy_names:
-                        if name not in current: current.append(name)
-                    group['proxies'] = [p for p in current if p in managed_node_names or p in external_proxy_names]
-                elif group_type == 'select':
-                    current = group.get('proxies', [])
-                    for name in select_proxies:
-                        if name not in current:
-                            if 'DIRECT' in current: current.insert(current.index('DIRECT'), name)
-                            else: current.append(name)
-                    group['proxies'] = [p for p in current if p in select_proxies or p in ['DIRECT', 'REJECT']]
-
-            # Calculate User-Info Header
-            total_limit_bytes = 0
-            used_bytes = 0
-            earliest_expiry = 0
-            
-            if current_sub:
-                # Use Plan-specific stats for header
-                nodes_map = {n['id']: n['used_bytes'] for n in config["nodes"]}
-                used_bytes = 0
-                for nid in node_ids_filter:
-                    if nid in nodes_map:
-                        base = current_sub.get('traffic_base', {}).get(nid, 0)
-                        used_bytes += max(0, nodes_map[nid] - base)
-                total_limit_bytes = int(current_sub.get('limit_gb', 0) * (1024**3))
-            else:
-                # Aggregate from nodes (fallback)
-                filtered_node_confs = [n for n in config["nodes"] if node_ids_filter is None or n["id"] in node_ids_filter]
-                for n in filtered_node_confs:
-                    total_limit_bytes += (n.get('limit_gb', 0) * (1024**3))
-                    used_bytes += n.get('used_bytes', 0)
-                    if n.get('expiry'):
-                        try:
-                            ts = int(time.mktime(time.strptime(n['expiry'], "%Y-%m-%d")))
-                            if earliest_expiry == 0 or ts < earliest_expiry: earliest_expiry = ts
-                        except: pass
-            
-            if current_sub and current_sub.get("expiry"):
-                sub_ts = int(time.mktime(time.strptime(current_sub['expiry'], "%Y-%m-%d")))
-                if earliest_expiry == 0 or sub_ts < earliest_expiry: earliest_expiry = sub_ts
-            
-            user_info = f"upload=0; download={used_bytes}; total={total_limit_bytes}; expire={earliest_expiry}"
+            # Everything the rendered body depends on
+            node_confs = snap.nodes if node_ids_filter is None else snap.select_nodes(node_ids_filter)
+            upstream_versions = tuple(UPSTREAMS.nodes(n['url'])[0] for n in node_confs if not n['url'].startswith(DIRECT_SCHEMES))
+            version = (snap.version, template_path, TEMPLATES.version(template_path), PUBLIC_IP.get(snap), upstream_versions)
 
-            # Finalize YAML
-            yaml_content = yaml.dump(config_yaml, allow_unicode=True, default_flow_style=False, sort_keys=False)
-            body = yaml_content.encode('utf-8')
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/yaml; charset=utf-8')
-            self.send_header('Content-Length', str(len(body)))
-            self.send_header('Subscription-Userinfo', user_info)
-            self.send_header('Content-Disposition', 'attachment; filename="sub_hub.yaml"')
+            user_info = self.subscription_userinfo(snap, traffic, current_sub, node_ids_filter)
+            entry = RENDER_CACHE.get(token, version)
+            if entry is None:
+                nodes = self.fetch_all_nodes(node_ids_filter=node_ids_filter, snap=snap)
+                if not nodes:
+                    self.send_error(500, "No nodes available for this subscription.")
+                    return
+                if STREAM_MIN_PROXIES and len(nodes) >= STREAM_MIN_PROXIES:
+                    # Too big to keep whole per request: write it out as it's serialized
+                    self.send_streamed(self.stream_profile(nodes, current_sub, template_path), user_info)
+                    return
+                entry = RENDER_CACHE.put(token, version, self.build_profile(nodes, current_sub, template_path))
+            self.send_rendered(entry, user_info)
+
+        except Exception as e:
+            self.send_error(500, f"Internal Error: {e}")
+
+    def send_rendered(self, entry, user_info=None, filename='sub_hub.yaml'):
+        """Send a cached render (precompressed if negotiated), or 304 if the client already has it."""
+        content_type = 'text/yaml; charset=utf-8'
+        encoding, negotiable = self.content_encoding(entry.body, content_type)
+        etag = encoded_etag(entry.etag, encoding)
+        if_none_match = self.headers.get('If-None-Match')
+        if etag_matches(if_none_match, etag) or etag_matches(if_none_match, entry.etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            if negotiable:
+                self.send_header('Vary', 'Accept-Encoding')
+            if user_info:
+                self.send_header('Subscription-Userinfo', user_info)
             self.end_headers()
-            try:
-                self.wfile.write(body)
-                self.wfile.flush()
-            except BrokenPipeError:
-                pass
+            return
+
+        self.send_body(entry.body, content_type, [
+            ('Subscription-Userinfo', user_info),
+            ('Content-Disposition', f'attachment; filename="{filename}"'),
+        ], variants=entry.variants, etag=entry.etag)
+
+    def send_streamed(self, fragments, user_info=None, filename='sub_hub.yaml'):
+        """Send YAML text fragments as they are produced, buffered to STREAM_CHUNK_SIZE.
+
+        HTTP/1.1 clients get Transfer-Encoding: chunked (and keep the
+        connection), HTTP/1.0 clients a body delimited by closing it; a
+        negotiated gzip/br is applied incrementally. There's no
+        Content-Length or ETag, and an error halfway through drops the
+        connection so the client sees a truncated response, not a short
+        profile.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        encoding = negotiate(self.headers.get('Accept-Encoding'))
+        encoder = StreamEncoder(encoding) if encoding else None
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/yaml; charset=utf-8')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if user_info:
+            self.send_header('Subscription-Userinfo', user_info)
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        if not chunked:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def write(data, last=False):
+            if encoder:
+                data = encoder.feed(data) + (encoder.finish() if last else b'')
+            if not data:
+                return  # an empty chunk would end the body
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+
+        buf = []
+        size = 0
+        try:
+            for text in fragments:
+                data = text.encode('utf-8')
+                buf.append(data)
+                size += len(data)
+                if size >= STREAM_CHUNK_SIZE:
+                    write(b''.join(buf))
+                    buf, size = [], 0
+            write(b''.join(buf), last=True)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            print(f"Error streaming profile: {e}")
+            self.close_connection = True
+
+    def convert(self, params):
+        """GET /convert?url=<link|subscription>[|<more>]&template=<name>[&token=]
+
+        In-process replacement for the subconverter service: direct links go
+        through the parse cache, subscription URLs the hub tracks through the
+        scheduler and any other one through CONVERT_SOURCES (public addresses
+        only, 403 otherwise); the result is rendered with the hub's templates
+        and kept in the render cache.
+        """
+        try:
+            if CONVERT_TOKEN and params.get('token', [None])[0] != CONVERT_TOKEN:
+                self.send_error(403, "Invalid token.")
+                return
+            sources = [u.strip() for value in params.get('url', []) for u in value.split('|') if u.strip()]
+            if not sources:
+                self.send_error(400, "Missing url")
+                return
+            if len(sources) > CONVERT_MAX_SOURCES:
+                self.send_error(400, f"At most {CONVERT_MAX_SOURCES} sources per request")
+                return
+            template_path = resolve_template(os.path.basename(params.get('template', [''])[0]))
 
+            cache_key = 'convert:' + '|'.join(sources)
+            version = (template_path, TEMPLATES.version(template_path))
+            entry = RENDER_CACHE.get(cache_key, version)
+            if entry is None:
+                nodes = []
+                for source in sources:
+                    try:
+                        if source.startswith(('http://', 'https://')):
+                            if UPSTREAMS.tracks(source):
+                                nodes.extend(clone(n) for n in UPSTREAMS.nodes(source)[1])
+                            else:
+                                nodes.extend(clone(n) for n in CONVERT_SOURCES.nodes(source))
+                        elif '://' in source:
+                            nodes.append(PARSE_CACHE.parse(source))
+                    except PrivateTargetError as e:
+                        self.send_error(403, f"Refusing non-public source: {e}")
+                        return
+                    except Exception as e:
+                        print(f"Error converting source {source}: {e}")
+                if not nodes:
+                    self.send_error(502, "No nodes could be read from the given url(s).")
+                    return
+                entry = RENDER_CACHE.put(cache_key, version, self.build_profile(nodes, None, template_path), ttl=CONVERT_TTL)
+            self.send_rendered(entry, filename='convert.yaml')
         except Exception as e:
             self.send_error(500, f"Internal Error: {e}")
 
@@ -766,15 +1250,276 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in separate threads for concurrent browser access."""
     daemon_threads = True
 
-def run_server():
-    server_address = ('', PORT)
-    httpd = ThreadedHTTPServer(server_address, SubBridgeHandler)
-    ip = get_public_ip()
-    print(f"Sub Hub v2 running at http://{ip}:{PORT}/dashboard")
+class SharedPortHTTPServer(ThreadedHTTPServer):
+    """ThreadedHTTPServer bound with SO_REUSEPORT, so worker processes can share the port."""
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+def make_server(engine, server_address, reuse_port=False):
+    if engine == 'asyncio':
+        return AsyncServer(server_address, SubBridgeHandler, ASYNC_WORKERS, ASYNC_MAX_CONNECTIONS, ASYNC_MAX_INFLIGHT,
+                           ASYNC_HEADER_TIMEOUT, ASYNC_BODY_TIMEOUT, KEEPALIVE_TIMEOUT, REQUEST_TIMEOUT,
+                           max_body_bytes=ASYNC_MAX_BODY, reuse_port=reuse_port)
+    return (SharedPortHTTPServer if reuse_port else ThreadedHTTPServer)(server_address, SubBridgeHandler)
+
+def start_background():
+    PUBLIC_IP.start()
+    TRAFFIC.start()
+    UPSTREAMS.start()
+
+def stop_background():
+    PUBLIC_IP.stop()
+    TRAFFIC.stop()
+    UPSTREAMS.stop()
+    CONFIG_STORE.close()
+    USAGE_LEDGER.save()
+    TRAFFIC_HISTORY.save()
+
+def run_server(engine=ENGINE, processes=PROCESSES):
+    if processes > 1:
+        run_primary(engine, processes)
+        return
+    httpd = make_server(engine, ('', PORT))
+    start_background()
+    ip = PUBLIC_IP.get()
+    print(f"Sub Hub v2 running at http://{ip}:{PORT}/dashboard ({engine} engine)")
+    # systemd stops us with SIGTERM; unwind like Ctrl+C so pending writes get flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # kill -HUP reloads templates without waiting for the mtime check
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: TEMPLATES.clear())
+    try:
+        httpd.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        stop_background()
+        httpd.server_close()
+
+def process_stats(server):
+    """This process's cache and server counters."""
+    return {"parse_cache": PARSE_CACHE.stats(), "render_cache": RENDER_CACHE.stats(), "upstream": UPSTREAM.stats(),
+            "convert_sources": CONVERT_SOURCES.stats(), "templates": TEMPLATES.stats(), "static": STATIC_CACHE.stats(),
+            "server": server.stats() if hasattr(server, 'stats') else {"engine": "threaded"}}
+
+def worker_stats_path(pid):
+    return f"{SHARED_SNAPSHOT_FILE}.{pid}.stats"
+
+def write_worker_stats(server):
+    """Dump this worker's counters where the primary's /api/stats reads them."""
+    path = worker_stats_path(os.getpid())
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(dict(process_stats(server), pid=os.getpid(), updated_at=time.time()), f)
+    os.replace(tmp, path)
+
+def read_worker_stats():
+    """Counters of every live worker, as last dumped (at most WORKER_STATS_INTERVAL old)."""
+    prefix, suffix = f"{SHARED_SNAPSHOT_FILE}.", ".stats"
+    folder = os.path.dirname(SHARED_SNAPSHOT_FILE)
+    result = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not (path.startswith(prefix) and path.endswith(suffix)):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if time.time() - stats.get("updated_at", 0) <= 3 * WORKER_STATS_INTERVAL:
+            result.append(stats)
+    return sorted(result, key=lambda stats: stats["pid"])
+
+def remove_worker_stats(pid):
+    try:
+        os.remove(worker_stats_path(pid))
+    except OSError:
+        pass
+
+def supervise_workers(engine, control, processes):
+    """Pre-fork helper: fork the workers and fork again any that exits, without ever starting a thread.
+
+    The primary forks this process before its own background threads run,
+    so every worker, respawned ones included, comes from a single-threaded
+    process and can't inherit a lock another thread held at fork time.
+    """
+    control.socket.close()
+    parent = os.getppid()
+    workers = set()
+    stopping = []
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(engine, control)
+            except Exception as e:
+                print(f"Worker error: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        workers.add(pid)
+
+    def forward(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))  # Ctrl-C: the primary stops us
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, forward)
+    for _ in range(processes):
+        spawn()
+    while not stopping and os.getppid() == parent:
+        time.sleep(WORKER_RESPAWN_DELAY)
+        for pid in list(workers):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done:
+                workers.discard(pid)
+                remove_worker_stats(pid)
+                if not stopping:
+                    print(f"Worker {pid} exited (status {os.waitstatus_to_exitcode(status)}), starting a new one")
+                    spawn()
+    forward(signal.SIGTERM, None)
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+        remove_worker_stats(pid)
+
+def run_primary(engine, processes):
+    """Multi-process mode: own the config, traffic and upstreams here, serve PORT from forked workers.
+
+    Workers are forked by a supervisor process (supervise_workers), itself
+    forked before any background thread starts, and wait for the first
+    published state; the API is served on a loopback port that the workers
+    relay to. A worker that exits is forked again by the supervisor.
+    """
+    global SHARED_PUBLISHER
+    if not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("Multi-process mode needs fork() and SO_REUSEPORT, running a single process")
+        run_server(engine, 1)
+        return
+    # SO_REUSEPORT would let a second hub share the port (and snapshot file) silently: fail like one process would
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind(('', PORT))
+    control = ThreadedHTTPServer((CONTROL_HOST, CONTROL_PORT), SubBridgeHandler)
+    SHARED_PUBLISHER = SnapshotPublisher(SHARED_SNAPSHOT_FILE, SHARED_SNAPSHOT_CAPACITY)
+    sys.stdout.flush()
+    supervisor = os.fork()
+    if supervisor == 0:
+        code = 0
+        try:
+            supervise_workers(engine, control, processes)
+        except Exception as e:
+            print(f"Worker supervisor error: {e}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    stopping = threading.Event()
+
+    def watch_supervisor():
+        os.waitpid(supervisor, 0)
+        if not stopping.is_set():
+            print("Worker supervisor exited, stopping")
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def reload_templates(signum, frame):
+        TEMPLATES.clear()
+        try:
+            os.kill(supervisor, signal.SIGHUP)  # Passed on to every worker
+        except ProcessLookupError:
+            pass
+
+    start_background()
+    SHARED_PUBLISHER.publish(shared_state())
+    SHARED_PUBLISHER.start(shared_state_key, shared_state, SHARED_PUBLISH_INTERVAL)
+    watcher = threading.Thread(target=watch_supervisor, name='supervisor-watch', daemon=True)
+    watcher.start()
+    ip = PUBLIC_IP.get()
+    print(f"Sub Hub v2 running at http://{ip}:{PORT}/dashboard ({processes} {engine} workers, "
+          f"API on {CONTROL_HOST}:{control.server_address[1]})")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_templates)
+    try:
+        control.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        stopping.set()
+        try:
+            os.kill(supervisor, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        watcher.join()
+        SHARED_PUBLISHER.close()
+        stop_background()
+        control.server_close()
+
+def run_worker(engine, control):
+    """Forked worker: render subscriptions from the shared snapshot, relay the API to the primary."""
+    global CONFIG_STORE, TRAFFIC, USAGE_LEDGER, PUBLIC_IP, UPSTREAMS, UPSTREAM, PRIMARY_ADDRESS
+    global PARSE_CACHE, RENDER_CACHE, STATIC_CACHE, TEMPLATES, CONVERT_SOURCES
+    control.socket.close()
+    parent = os.getppid()
+    # Own caches, sized and counted per worker
+    PARSE_CACHE = ParsedNodeCache(ProxyParser.parse, PARSE_CACHE_SIZE)
+    RENDER_CACHE = RenderCache(RENDER_CACHE_SIZE)
+    STATIC_CACHE = StaticCache()
+    TEMPLATES = TemplateCache(load_template, TEMPLATE_CHECK_INTERVAL)
+    UPSTREAM = UpstreamCache(UPSTREAM_CACHE_DIR, UPSTREAM_TIMEOUT, UPSTREAM_MAX_BYTES, parse_upstream_body)
+    CONVERT_SOURCES = AdHocSources(parse_upstream_body, CONVERT_CACHE_SIZE, CONVERT_TTL, UPSTREAM_TIMEOUT, UPSTREAM_MAX_BYTES)
+    shared = SnapshotReader(SHARED_SNAPSHOT_FILE)
+    CONFIG_STORE = SharedConfigStore(shared)
+    TRAFFIC = SharedTraffic(shared)
+    USAGE_LEDGER = SharedUsage(shared)
+    PUBLIC_IP = SharedPublicIP(shared)
+    UPSTREAMS = SharedUpstreams(shared, UPSTREAM, parse_upstream_body)
+    PRIMARY_ADDRESS = control.server_address
+    httpd = make_server(engine, ('', PORT), reuse_port=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: TEMPLATES.clear())
+
+    def watch_primary():
+        ticks = 0
+        while os.getppid() == parent:
+            if ticks % WORKER_STATS_INTERVAL == 0:
+                try:
+                    write_worker_stats(httpd)
+                except Exception as e:
+                    print(f"Worker stats error: {e}")
+            ticks += 1
+            time.sleep(1)
+        os.kill(os.getpid(), signal.SIGTERM)  # Supervisor (and so the primary) is gone, nobody publishes any more
+
+    threading.Thread(target=watch_primary, name='primary-watch', daemon=True).start()
     try:
+        # Nothing to render from until the primary has published its first state
+        shared.wait()
         httpd.serve_forever()
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
         httpd.server_close()
+        shared.close()
+        remove_worker_stats(os.getpid())
 
 if __name__ == '__main__':
-    run_server()
+    parser = argparse.ArgumentParser(description='Sub Hub subscription server')
+    parser.add_argument('--engine', choices=('threaded', 'asyncio'), default=ENGINE,
+                        help='threaded: a thread per connection; asyncio: event loop with a bounded worker pool')
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help='worker processes sharing the port (SO_REUSEPORT); 1 = a single process')
+    args = parser.parse_args()
+    run_server(args.engine, args.processes)
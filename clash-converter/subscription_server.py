@@ -22,6 +22,14 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from typing import Dict, List, Optional
 
+try:
+    from yaml_io import load as yaml_load, dump as yaml_dump
+except ImportError:  # 单独拷出来用时没有 yaml_io，退回纯 PyYAML（输出一致）
+    yaml_load = yaml.safe_load
+
+    def yaml_dump(data):
+        return yaml.dump(data, allow_unicode=True, default_flow_style=False, sort_keys=False)
+
 # 配置文件路径
 CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
 NODES_FILE = os.path.join(CONFIG_DIR, 'nodes.json')
@@ -174,12 +182,12 @@ class ConfigManager:
         # 加载规则模板
         if os.path.exists(TEMPLATE_FILE):
             with open(TEMPLATE_FILE, 'r', encoding='utf-8') as f:
-                rules_config = yaml.safe_load(f)
+                rules_config = yaml_load(f)
                 config['rules'] = rules_config.get('rules', [])
         else:
             config['rules'] = ['MATCH,🚀 代理选择']
         
-        return yaml.dump(config, allow_unicode=True, default_flow_style=False, sort_keys=False)
+        return yaml_dump(config)
     
     def health_check(self) -> Dict:
         """节点健康检查"""
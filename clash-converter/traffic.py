@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub traffic poller
+Reads the 3x-ui inbound counters in the background and publishes immutable
+snapshots, so request handlers never open SQLite themselves.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from urllib.parse import urlparse
+
+EMPTY = MappingProxyType({})
+
+
+def node_port(url):
+    """Inbound port of a managed node link, or None (e.g. vmess/base64 links)."""
+    try:
+        return urlparse(url).port
+    except Exception:
+        return None
+
+
+class TrafficSnapshot:
+    """Immutable view of inbound traffic: port -> bytes and node id -> bytes."""
+    __slots__ = ('version', 'port_bytes', 'node_ports', 'node_bytes', 'taken_at')
+
+    def __init__(self, version=0, port_bytes=EMPTY, node_ports=EMPTY, taken_at=0):
+        self.version = version
+        self.port_bytes = port_bytes
+        self.node_ports = node_ports
+        self.node_bytes = MappingProxyType({nid: port_bytes[port] for nid, port in node_ports.items() if port in port_bytes})
+        self.taken_at = taken_at
+
+
+class TrafficPoller:
+    """Polls `SELECT port, up, down FROM inbounds` on an interval.
+
+    Uses one persistent read-only connection and skips the query entirely
+    when `PRAGMA data_version` says nothing was committed since last time.
+    The node id -> port map is only rebuilt when the config snapshot changes.
+    Callables in `listeners` get (traffic_snapshot, config_snapshot) after
+    every new snapshot is published.
+    """
+
+    def __init__(self, db_path, config_store, interval=10):
+        self.db_path = db_path
+        self.config_store = config_store
+        self.interval = interval
+        self._snapshot = TrafficSnapshot()
+        self._conn = None
+        self._data_version = None
+        self._config_version = None
+        self._node_ports = EMPTY
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.listeners = []
+
+    def snapshot(self):
+        return self._snapshot
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+            self._data_version = None
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+
+    def poll_once(self):
+        """Refresh the snapshot if the DB or the node list changed. Returns True on change."""
+        config_snap = self.config_store.snapshot()
+        if not self._poll(config_snap):
+            return False
+        for listener in self.listeners:
+            try:
+                listener(self._snapshot, config_snap)
+            except Exception as e:
+                print(f"Traffic listener error: {e}")
+        return True
+
+    def _poll(self, config_snap):
+        with self._lock:
+            snap = self._snapshot
+            port_bytes = snap.port_bytes
+
+            nodes_changed = config_snap.version != self._config_version
+            if nodes_changed:
+                ports = {}
+                for n in config_snap.nodes:
+                    port = node_port(n.get('url', ''))
+                    if port is not None:
+                        ports[n['id']] = port
+                self._node_ports = MappingProxyType(ports)
+                self._config_version = config_snap.version
+
+            db_changed = False
+            if os.path.exists(self.db_path):
+                try:
+                    conn = self._connect()
+                    data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+                    if data_version != self._data_version:
+                        rows = conn.execute('SELECT port, up, down FROM inbounds').fetchall()
+                        new_bytes = {int(port): (up or 0) + (down or 0) for port, up, down in rows}
+                        self._data_version = data_version
+                        if new_bytes != port_bytes:
+                            port_bytes = MappingProxyType(new_bytes)
+                            db_changed = True
+                except (sqlite3.Error, ValueError, TypeError) as e:
+                    print(f"Traffic poll error: {e}")
+                    self._close()
+
+            if not (nodes_changed or db_changed):
+                return False
+            self._snapshot = TrafficSnapshot(snap.version + 1, port_bytes, self._node_ports, time.time())
+            return True
+
+    def start(self):
+        self.poll_once()
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='traffic-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Traffic poller error: {e}")
+
+
+class UsageLedger:
+    """Per-subscription usage, maintained incrementally from traffic snapshots.
+
+    Every (subscription, node) pair remembers its traffic_base, the last raw
+    counter it saw and the bytes accumulated so far. A new snapshot only
+    touches the pairs of nodes whose counter moved, so reading a
+    subscription's usage is a dict lookup. When a 3x-ui counter goes
+    backwards (inbound reset) the pair starts a new epoch from zero instead
+    of clamping the whole node to 0. Pairs are saved to `path` whenever an
+    epoch rolls over, so carried bytes survive a hub restart.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._pairs = {}    # (sub_id, node_id) -> {"base", "last", "used", "epochs"}
+        self._by_node = {}  # node_id -> [(sub_id, node_id), ...]
+        self._totals = {}   # sub_id -> bytes
+        self._node_raw = {}  # node_id -> raw counter last applied
+        self._config_version = None
+        self._traffic_version = None
+        self._lock = threading.Lock()
+        self._saved = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {tuple(k.split('\t', 1)): v for k, v in json.load(f).items()}
+        except Exception as e:
+            print(f"Error loading usage ledger: {e}")
+            return {}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {'\t'.join(k): v for k, v in self._pairs.items()}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _advance(pair, raw):
+        """Fold a new raw counter into a pair. Returns True if a new epoch started."""
+        if raw >= pair["last"]:
+            pair["used"] += raw - pair["last"]
+            pair["last"] = raw
+            return False
+        # Counter went backwards: 3x-ui reset the inbound, count from zero again
+        pair["used"] += raw
+        pair["last"] = raw
+        pair["epochs"] += 1
+        return True
+
+    def _rebuild(self, config_snap, raw_of):
+        pairs, by_node, totals = {}, {}, {}
+        for s in config_snap.subscriptions:
+            sub_id = s.get("id")
+            if sub_id is None or sub_id in totals:
+                continue
+            totals[sub_id] = 0
+            bases = s.get("traffic_base", {})
+            for nid in dict.fromkeys(s.get("node_ids", ())):
+                if nid not in raw_of:
+                    continue
+                key = (sub_id, nid)
+                base = bases.get(nid, 0)
+                pair = self._pairs.get(key) or self._saved.get(key)
+                if pair is None or pair["base"] != base:
+                    # Fresh pair: everything since the base belongs to it
+                    pair = {"base": base, "last": base, "used": 0, "epochs": 0}
+                else:
+                    pair = dict(pair)
+                pairs[key] = pair
+                totals[sub_id] += pair["used"]
+                by_node.setdefault(nid, []).append(key)
+        self._pairs, self._by_node, self._totals = pairs, by_node, totals
+        self._saved = {}
+        self._node_raw = {}
+
+    def sync(self, config_snap, traffic):
+        """Bring the ledger up to date with the given config and traffic snapshots."""
+        if config_snap.version == self._config_version and traffic.version == self._traffic_version:
+            return
+        rolled = False
+        with self._lock:
+            if self._config_version is not None and (config_snap.version < self._config_version or traffic.version < self._traffic_version):
+                return  # Stale snapshots from a slow reader, applying them would look like a reset
+            raw_of = {n["id"]: traffic.node_bytes.get(n["id"], n.get("used_bytes", 0)) for n in config_snap.nodes}
+            if config_snap.version != self._config_version:
+                self._rebuild(config_snap, raw_of)
+            for nid, keys in self._by_node.items():
+                raw = raw_of.get(nid, 0)
+                if self._node_raw.get(nid) == raw:
+                    continue
+                self._node_raw[nid] = raw
+                for key in keys:
+                    pair = self._pairs[key]
+                    before = pair["used"]
+                    rolled |= self._advance(pair, raw)
+                    self._totals[key[0]] += pair["used"] - before
+            self._config_version = config_snap.version
+            self._traffic_version = traffic.version
+        if rolled:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Error saving usage ledger: {e}")
+
+    def usage(self, sub_id):
+        return self._totals.get(sub_id, 0)
+
+    def totals(self):
+        """sub_id -> bytes for every subscription (a copy)."""
+        with self._lock:
+            return dict(self._totals)
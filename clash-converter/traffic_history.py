@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub traffic history
+Fixed-size ring buffers of byte counts per node and per subscription:
+per-minute slots for the last day, per-hour slots for the last few months.
+Every series costs the same fixed memory and there are never more than
+max_series of them, whatever the node count.
+"""
+
+import os
+import struct
+import threading
+import time
+from array import array
+
+MAGIC = b'SHTS1'
+
+
+class Ring:
+    """Array-backed ring of int64 byte counts, one slot per `step` seconds."""
+    __slots__ = ('step', 'size', 'values', 'head')
+
+    def __init__(self, step, size):
+        self.step = step
+        self.size = size
+        self.values = array('q', bytes(8 * size))
+        self.head = -1  # Period number of the newest slot, -1 = empty
+
+    def add(self, ts, amount):
+        p = int(ts // self.step)
+        if p > self.head:
+            # Zero the slots we skipped over (at most one full lap)
+            for q in range(max(self.head + 1, p - self.size + 1), p + 1):
+                self.values[q % self.size] = 0
+            self.head = p
+        elif p <= self.head - self.size:
+            return
+        self.values[p % self.size] += amount
+
+    def points(self, start, end):
+        """[(slot_start_ts, bytes)] for slots overlapping [start, end]."""
+        if self.head < 0:
+            return []
+        first = max(int(start // self.step), self.head - self.size + 1)
+        last = min(int(end // self.step), self.head)
+        return [(p * self.step, self.values[p % self.size]) for p in range(first, last + 1)]
+
+
+class Series:
+    __slots__ = ('minutes', 'hours', 'touched')
+
+    def __init__(self, minute_slots, hour_slots):
+        self.minutes = Ring(60, minute_slots)
+        self.hours = Ring(3600, hour_slots)
+        self.touched = 0
+
+    def add(self, ts, amount):
+        self.minutes.add(ts, amount)
+        self.hours.add(ts, amount)
+        self.touched = ts
+
+    def idleness(self):
+        """Sort key, idlest first: last write, then bytes in the newest hour slot."""
+        hours = self.hours
+        return self.touched, hours.values[hours.head % hours.size] if hours.head >= 0 else 0
+
+
+class TrafficHistory:
+    """Samples cumulative counters into per-node / per-subscription rings.
+
+    Series keys are "node:<id>" and "sub:<id>". record() takes cumulative
+    byte counters and stores the deltas; a counter going backwards counts
+    as a reset (the new value is the delta).
+
+    Each record() call is the full set of live keys. Beyond `max_series`
+    series, those of keys missing from it (deleted nodes / subscriptions)
+    are evicted first, then the idlest live ones. A live key that lost its
+    series is listed in `dropped` and only gets a new one once a slot is
+    free, so the series don't churn; its baseline is kept either way.
+    """
+
+    def __init__(self, path=None, minute_slots=24 * 60, hour_slots=24 * 92, max_series=256):
+        self.path = path
+        self.minute_slots = minute_slots
+        self.hour_slots = hour_slots
+        self.max_series = max_series
+        self._series = {}
+        self._last = {}  # key -> last cumulative counter seen
+        self.dropped = set()  # Live keys whose series was evicted by the cap
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def record(self, counters, ts=None):
+        """Fold {key: cumulative_bytes} (every live key) into the rings."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for key, value in counters.items():
+                last = self._last.get(key)
+                self._last[key] = value
+                if last is None:
+                    continue  # First sight is only a baseline
+                delta = value - last if value >= last else value
+                if delta:
+                    series = self._series.get(key)
+                    if series is None:
+                        if key in self.dropped and len(self._series) >= self.max_series:
+                            continue
+                        self.dropped.discard(key)
+                        series = self._series[key] = Series(self.minute_slots, self.hour_slots)
+                    series.add(ts, delta)
+                    self._dirty = True
+            if len(self._last) > len(counters):
+                self._last = {k: v for k, v in self._last.items() if k in counters}
+                self.dropped &= counters.keys()
+            if len(self._series) > self.max_series:  # Also trims a file saved under a larger cap
+                self._evict(counters)
+
+    def _evict(self, live):
+        """Cut down to max_series: series of deleted keys first, then live ones, idlest first."""
+        order = sorted(self._series, key=lambda k: (k in live, self._series[k].idleness()))
+        lost = []
+        for key in order[:len(self._series) - self.max_series]:
+            del self._series[key]
+            if key in live:
+                lost.append(key)
+        if lost:
+            self.dropped.update(lost)
+            more = f" and {len(lost) - 5} more" if len(lost) > 5 else ""
+            print(f"Traffic history full ({self.max_series} series), dropped idle {', '.join(lost[:5])}{more}")
+
+    def is_dropped(self, key):
+        """Was key's series evicted by the cap while it is still live?"""
+        return key in self.dropped
+
+    def stats(self):
+        with self._lock:
+            return {"series": len(self._series), "max_series": self.max_series, "dropped": sorted(self.dropped)}
+
+    def query(self, key, seconds, max_points=120, now=None):
+        """Downsampled series for the last `seconds`, or None if the key is unknown.
+
+        Ranges up to one day use minute slots, longer ones hour slots.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return None
+            ring = series.minutes if seconds <= self.minute_slots * 60 else series.hours
+            raw = ring.points(now - seconds, now)
+            rate_points = series.minutes.points(now - 300, now)
+        step = ring.step
+        if len(raw) > max_points:
+            group = -(-len(raw) // max_points)
+            raw = [(raw[i][0], sum(v for _, v in raw[i:i + group])) for i in range(0, len(raw), group)]
+            step *= group
+        total = sum(v for _, v in raw)
+        recent = sum(v for _, v in rate_points)
+        return {
+            "step": step,
+            "points": raw,
+            "total": total,
+            "rate_bps": round(recent / 300.0, 2),
+            "avg_bps": round(total / float(seconds), 2) if seconds else 0,
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            chunks = [MAGIC, struct.pack('<III', self.minute_slots, self.hour_slots, len(self._series))]
+            for key, series in self._series.items():
+                k = key.encode('utf-8')
+                chunks.append(struct.pack('<H', len(k)))
+                chunks.append(k)
+                chunks.append(struct.pack('<qqd', series.minutes.head, series.hours.head, series.touched))
+                chunks.append(series.minutes.values.tobytes())
+                chunks.append(series.hours.values.tobytes())
+            self._dirty = False
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(b''.join(chunks))
+        os.replace(tmp, self.path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("bad magic")
+            off = len(MAGIC)
+            minute_slots, hour_slots, count = struct.unpack_from('<III', data, off)
+            off += 12
+            if (minute_slots, hour_slots) != (self.minute_slots, self.hour_slots):
+                print("Traffic history layout changed, starting fresh")
+                return
+            series_map = {}
+            for _ in range(count):
+                (klen,) = struct.unpack_from('<H', data, off)
+                off += 2
+                key = data[off:off + klen].decode('utf-8')
+                off += klen
+                series = Series(minute_slots, hour_slots)
+                series.minutes.head, series.hours.head, series.touched = struct.unpack_from('<qqd', data, off)
+                off += 24
+                for ring in (series.minutes, series.hours):
+                    n = ring.size * 8
+                    ring.values = array('q', data[off:off + n])
+                    off += n
+                series_map[key] = series
+            # Which keys are live is only known at the next record(), which evicts if needed
+            with self._lock:
+                self._series = series_map
+        except Exception as e:
+            print(f"Error loading traffic history: {e}")
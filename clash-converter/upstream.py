@@ -0,0 +1,787 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub Hub upstream cache
+Keeps the last good body of every upstream subscription URL on disk together
+with its ETag / Last-Modified, revalidates it with conditional GETs and
+falls back to the stored copy when the upstream is down. A background
+scheduler refreshes the sources so subscription requests never wait on them.
+Bodies are streamed to disk and decoded in chunks, never held whole.
+One-off sources (/convert) are fetched from public addresses only and kept
+parsed in a bounded in-memory LRU, never in the cache directory.
+"""
+
+import os
+import re
+import json
+import time
+import codecs
+import random
+import socket
+import hashlib
+import binascii
+import tempfile
+import ipaddress
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+import urllib.parse
+import urllib.request
+import urllib.error
+import yaml_io
+from hub_cache import LRUCache
+
+
+CHUNK_SIZE = 64 * 1024
+B64_CHARS = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_')
+B64_URLSAFE = bytes.maketrans(b'-_', b'+/')
+CLASH_TOP_KEY = re.compile(rb'^(proxies|proxy-groups|proxy-providers|rules|port|mixed-port|socks-port|'
+                           rb'allow-lan|mode|log-level|dns|external-controller)\s*:', re.M)
+
+
+class UpstreamError(Exception):
+    """Upstream failed and there is no cached copy to fall back to."""
+
+
+class PrivateTargetError(UpstreamError):
+    """A one-off source resolves to a loopback, private, link-local or otherwise non-public address."""
+
+
+class UpstreamResult:
+    """Body of one upstream fetch, stored at `path`.
+
+    `source` is 'network', 'revalidated', 'stale' or 'disk'. `nodes` holds
+    what the cache's parse() made of a fresh body, None if it wasn't parsed.
+    """
+    __slots__ = ('url', 'path', 'source', 'fetched_at', 'error', 'nodes')
+
+    def __init__(self, url, path, source, fetched_at, error=None, nodes=None):
+        self.url = url
+        self.path = path
+        self.source = source
+        self.fetched_at = fetched_at
+        self.error = error
+        self.nodes = nodes
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    @property
+    def body(self):
+        with self.open() as f:
+            return f.read()
+
+
+def _b64_chunks(first, stream, chunk_size):
+    """Decode base64 text arriving in chunks; whitespace and MIME line breaks are skipped."""
+    carry = b''
+    chunk = first
+    while chunk:
+        data = carry + b''.join(chunk.split()).translate(B64_URLSAFE).rstrip(b'=')
+        cut = len(data) - len(data) % 4
+        carry = data[cut:]
+        if cut:
+            yield binascii.a2b_base64(data[:cut])
+        chunk = stream.read(chunk_size)
+    if carry:
+        if len(carry) == 1:
+            return  # A single leftover char can't encode anything
+        yield binascii.a2b_base64(carry + b'=' * (-len(carry) % 4))
+
+
+def _raw_chunks(first, stream, chunk_size):
+    chunk = first
+    while chunk:
+        yield chunk
+        chunk = stream.read(chunk_size)
+
+
+class _CappedReader:
+    """Wraps a binary stream and raises ValueError once more than max_bytes were read."""
+
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.total = 0
+
+    def read(self, n):
+        chunk = self.stream.read(n)
+        self.total += len(chunk)
+        if self.max_bytes and self.total > self.max_bytes:
+            raise ValueError(f"subscription body larger than {self.max_bytes} bytes")
+        return chunk
+
+
+def iter_links(stream, max_bytes=0, max_links=0, chunk_size=CHUNK_SIZE):
+    """Yield the proxy links of a subscription body one at a time.
+
+    `stream` is a binary file object holding either a plain link list or
+    its base64 encoding (standard or URL-safe, padded or not, wrapped or
+    not). Only lines containing '://' are yielded. Reading stops with a
+    ValueError past `max_bytes` of input, and quietly after `max_links`
+    links (0 = no limit).
+    """
+    stream = _CappedReader(stream, max_bytes)
+    first = stream.read(chunk_size)
+    head = first.lstrip()[:256]
+    is_b64 = head and b'://' not in head and all(c in B64_CHARS or c in b' \t\r\n' for c in head)
+    chunks = (_b64_chunks if is_b64 else _raw_chunks)(first, stream, chunk_size)
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    count = 0
+    for data in chunks:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            line = line.strip()
+            if '://' in line:
+                yield line
+                count += 1
+                if max_links and count >= max_links:
+                    print(f"Subscription has more than {max_links} links, ignoring the rest")
+                    return
+    pending = (pending + decoder.decode(b'', final=True)).strip()
+    if '://' in pending:
+        yield pending
+
+
+def sniff_clash_yaml(stream, head_size=CHUNK_SIZE):
+    """True if a seekable binary stream holds a Clash YAML profile rather than a link list."""
+    head = stream.read(head_size)
+    stream.seek(0)
+    return bool(CLASH_TOP_KEY.search(head))
+
+
+def iter_clash_proxies(stream, max_bytes=0, max_links=0):
+    """Yield the `proxies` entries of a Clash YAML profile, read through the byte cap."""
+    doc = yaml_io.load(_CappedReader(stream, max_bytes))
+    proxies = doc.get('proxies') if isinstance(doc, dict) else None
+    count = 0
+    for proxy in proxies or ():
+        if not (isinstance(proxy, dict) and proxy.get('name') and proxy.get('type') and proxy.get('server')):
+            continue
+        proxy['name'] = str(proxy['name'])
+        yield proxy
+        count += 1
+        if max_links and count >= max_links:
+            print(f"Subscription has more than {max_links} proxies, ignoring the rest")
+            return
+
+
+class UpstreamCache:
+    """URL -> last good body, stored as <sha1>.body + <sha1>.json in cache_dir.
+
+    fetch() always goes to the upstream, sending If-None-Match /
+    If-Modified-Since when a copy is cached. A 304 reuses the stored body,
+    a 200 replaces it, and any error (timeout, refused, 5xx...) serves the
+    stored body as stale instead of dropping the source's nodes.
+
+    With `parse(stream)` given, a 200 is staged first and only replaces the
+    stored body once it parses to at least one node; a login page, an HTML
+    error or an "expired" notice is rejected like any other error.
+    """
+
+    def __init__(self, cache_dir, timeout=10, max_bytes=0, parse=None):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.parse = parse
+        self._meta = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.counts = {"network": 0, "revalidated": 0, "stale": 0, "errors": 0, "rejected": 0}
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.body'), os.path.join(self.cache_dir, key + '.json')
+
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._locks.get(url)
+            if lock is None:
+                lock = self._locks[url] = threading.Lock()
+            return lock
+
+    def _read_meta(self, url):
+        """Validators stored on disk for url, or None."""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("url") != url or not os.path.exists(body_path):
+                return None
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def _load_meta(self, url):
+        """Validators for url, read from disk once; called under the url's lock."""
+        meta = self._meta.get(url)
+        if meta is None:
+            meta = self._read_meta(url)
+            if meta is not None:
+                self._meta[url] = meta
+        return meta
+
+    def _body_path(self, url):
+        """Path of the stored body, OSError if it's gone."""
+        path = self._paths(url)[0]
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return path
+
+    def _vet(self, path):
+        """Nodes parsed from a staged body; ValueError if there are none."""
+        try:
+            with open(path, 'rb') as f:
+                nodes = tuple(self.parse(f))
+        except Exception as e:
+            raise ValueError(f"unusable body: {e}") from e
+        if not nodes:
+            raise ValueError("unusable body: no nodes in it")
+        return nodes
+
+    def _store(self, url, response):
+        """Stage the response body (capped at max_bytes), promote it if it parses, record its validators.
+
+        Returns (meta, nodes); nodes is None without a parse().
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        body_path, meta_path = self._paths(url)
+        headers = response.headers
+        length = headers.get('Content-Length')
+        if self.max_bytes and length and length.isdigit() and int(length) > self.max_bytes:
+            raise ValueError(f"body of {length} bytes exceeds the {self.max_bytes} byte limit")
+        tmp = f'{body_path}.{os.getpid()}.tmp'  # Unique per process (multi-process mode)
+        try:
+            size = 0
+            with open(tmp, 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.max_bytes and size > self.max_bytes:
+                        raise ValueError(f"body exceeds the {self.max_bytes} byte limit")
+                    f.write(chunk)
+            nodes = None
+            if self.parse is not None:
+                try:
+                    nodes = self._vet(tmp)
+                except ValueError:
+                    self.counts["rejected"] += 1
+                    raise
+            os.replace(tmp, body_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        now = time.time()
+        meta = {
+            "url": url,
+            "etag": headers.get('ETag'),
+            "last_modified": headers.get('Last-Modified'),
+            "fetched_at": now,
+            "validated_at": now,
+        }
+        tmp = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        self._meta[url] = meta
+        return meta, nodes
+
+    def _touch(self, url, meta):
+        meta["validated_at"] = time.time()
+        meta_path = self._paths(url)[1]
+        tmp = f'{meta_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp, meta_path)  # cached() reads it without the url's lock
+        except OSError:
+            pass
+
+    def cached(self, url):
+        """Stored copy of url without touching the network, or None.
+
+        Doesn't take the url's lock, so it never waits on a fetch in
+        progress: body and meta are only ever replaced whole.
+        """
+        meta = self._meta.get(url) or self._read_meta(url)
+        if not meta:
+            return None
+        try:
+            return UpstreamResult(url, self._body_path(url), 'disk', meta["fetched_at"])
+        except OSError:
+            return None
+
+    def fetch(self, url):
+        """UpstreamResult for url; raises UpstreamError if it fails with nothing cached."""
+        with self._url_lock(url):
+            meta = self._load_meta(url)
+            request = urllib.request.Request(url)
+            if meta:
+                if meta.get("etag"):
+                    request.add_header('If-None-Match', meta["etag"])
+                if meta.get("last_modified"):
+                    request.add_header('If-Modified-Since', meta["last_modified"])
+            try:
+                try:
+                    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                        meta, nodes = self._store(url, response)
+                except urllib.error.HTTPError as e:
+                    if e.code != 304 or not meta:
+                        raise
+                    self._touch(url, meta)
+                    self.counts["revalidated"] += 1
+                    return UpstreamResult(url, self._body_path(url), 'revalidated', meta["fetched_at"])
+                self.counts["network"] += 1
+                return UpstreamResult(url, self._paths(url)[0], 'network', meta["fetched_at"], nodes=nodes)
+            except Exception as e:
+                self.counts["errors"] += 1
+                if meta:
+                    try:
+                        path = self._body_path(url)
+                    except OSError:
+                        path = None
+                    if path is not None:
+                        self.counts["stale"] += 1
+                        print(f"Upstream {url} failed ({e}), serving copy from {time.ctime(meta['fetched_at'])}")
+                        return UpstreamResult(url, path, 'stale', meta["fetched_at"], str(e))
+                raise UpstreamError(f"{url}: {e}") from e
+
+    def forget(self, url):
+        """Drop url's stored copy and bookkeeping (its source is gone from the config)."""
+        with self._url_lock(url):
+            self._meta.pop(url, None)
+            for path in self._paths(url):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._locks.pop(url, None)
+
+    def stats(self):
+        return dict(self.counts, cached=len(self._meta))
+
+
+def _resolve_public(host, port):
+    """getaddrinfo() for host, PrivateTargetError if any of its addresses isn't public."""
+    resolved = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    for *_, sockaddr in resolved:
+        ip = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise PrivateTargetError(f"{host} resolves to non-public address {ip}")
+    return resolved
+
+
+def _check_public_url(url):
+    """PrivateTargetError unless url is http(s) on a public host."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise PrivateTargetError(f"refusing {parts.scheme or 'relative'} URL {url}")
+    _resolve_public(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection() that refuses non-public addresses.
+
+    The check runs on the resolved addresses the socket then connects to,
+    so neither a redirect nor a DNS answer that changes between lookups
+    can reach the host's own services.
+    """
+    host, port = address
+    resolved = _resolve_public(host, port)
+    error = None
+    for *_, sockaddr in resolved:
+        try:
+            return socket.create_connection((sockaddr[0], port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error or OSError(f"cannot connect to {host}")
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection  # HTTPConnection sets it per instance
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows redirects only to http(s) URLs on public hosts, checked on every hop."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_public_url(urllib.parse.urljoin(req.full_url, newurl))
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def _public_opener():
+    """OpenerDirector with only the public HTTP(S) handlers: no proxy, file:, ftp: or data:."""
+    opener = urllib.request.OpenerDirector()
+    for handler in (_PublicHTTPHandler(), _PublicHTTPSHandler(), _PublicRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor(),
+                    urllib.request.UnknownHandler()):
+        opener.add_handler(handler)
+    return opener
+
+
+class AdHocSources:
+    """One-off source URL -> parsed nodes, for sources the hub doesn't track.
+
+    Only http(s) URLs on public addresses are fetched (no proxy, every
+    connection and redirect hop checked), bodies are spooled to an anonymous temp file that is
+    gone once parsed, and the nodes are kept in a bounded LRU for `ttl` seconds.
+    """
+
+    def __init__(self, parse, max_size=64, ttl=300, timeout=10, max_bytes=0):
+        self.parse = parse
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._cache = LRUCache(max_size)
+        self._opener = _public_opener()
+        self.rejected = 0
+
+    def _fetch(self, url):
+        try:
+            _check_public_url(url)
+            with self._opener.open(url, timeout=self.timeout) as response:
+                length = response.headers.get('Content-Length')
+                if self.max_bytes and length and length.isdigit() and int(length) > self.max_bytes:
+                    raise ValueError(f"body of {length} bytes exceeds the {self.max_bytes} byte limit")
+                with tempfile.SpooledTemporaryFile(CHUNK_SIZE * 16) as f:
+                    size = 0
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if self.max_bytes and size > self.max_bytes:
+                            raise ValueError(f"body exceeds the {self.max_bytes} byte limit")
+                        f.write(chunk)
+                    f.seek(0)
+                    return tuple(self.parse(f))
+        except PrivateTargetError:
+            self.rejected += 1
+            raise
+
+    def nodes(self, url):
+        """Parsed nodes of url (shared, callers copy before editing); PrivateTargetError for internal targets."""
+        entry = self._cache.get(url)
+        if entry is not None and time.time() < entry[0]:
+            return entry[1]
+        nodes = self._fetch(url)
+        self._cache.put(url, (time.time() + self.ttl, nodes))
+        return nodes
+
+    def stats(self):
+        return dict(self._cache.stats(), rejected=self.rejected)
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` failures in a row; open -> half-open after a backoff.
+
+    The backoff starts at `base_backoff` seconds and doubles every time a
+    half-open probe fails, up to `max_backoff`. One success closes it again.
+    """
+    __slots__ = ('threshold', 'base_backoff', 'max_backoff', 'state', 'failures', 'trips',
+                 'backoff', 'opened_at', 'retry_at')
+
+    def __init__(self, threshold=3, base_backoff=30, max_backoff=3600):
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = 'closed'
+        self.failures = 0
+        self.trips = 0
+        self.backoff = 0
+        self.opened_at = None
+        self.retry_at = None
+
+    def allow(self, now):
+        """May we call the upstream now? Moves open -> half-open once the backoff ran out."""
+        if self.state == 'open':
+            if now < self.retry_at:
+                return False
+            self.state = 'half-open'
+        return True
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.backoff = 0
+        self.retry_at = None
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == 'half-open':
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        elif self.failures >= self.threshold:
+            self.backoff = self.base_backoff
+        else:
+            return
+        if self.state != 'half-open':
+            self.trips += 1
+        self.state = 'open'
+        self.opened_at = now
+        self.retry_at = now + self.backoff
+
+    def status(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "backoff": self.backoff,
+            "opened_at": self.opened_at,
+            "retry_at": self.retry_at,
+        }
+
+
+class SourceState:
+    """Parsed nodes of one upstream source plus its refresh bookkeeping."""
+    __slots__ = ('url', 'interval', 'nodes', 'version', 'source', 'loaded', 'last_attempt', 'last_success',
+                 'fetched_at', 'duration', 'error', 'next_due', 'running', 'breaker')
+
+    def __init__(self, url, interval, breaker):
+        self.url = url
+        self.interval = interval
+        self.nodes = ()
+        self.version = 0
+        self.source = None
+        self.loaded = False  # The on-disk copy was parsed into nodes (even if that gave none)
+        self.last_attempt = None
+        self.last_success = None
+        self.fetched_at = None
+        self.duration = None
+        self.error = None
+        self.next_due = 0
+        self.running = False
+        self.breaker = breaker
+
+    def status(self):
+        return {
+            "url": self.url,
+            "interval": self.interval,
+            "node_count": len(self.nodes),
+            "source": self.source,
+            "last_attempt": self.last_attempt,
+            "last_success": self.last_success,
+            "fetched_at": self.fetched_at,
+            "duration_ms": None if self.duration is None else round(self.duration * 1000),
+            "error": self.error,
+            "next_refresh": self.next_due or None,
+            "refreshing": self.running,
+            "breaker": self.breaker.status(),
+        }
+
+
+class UpstreamScheduler:
+    """Refreshes every upstream source in the background through a bounded pool.
+
+    Sources are the node URLs that aren't direct links (`is_direct`); each
+    one is refreshed every `interval` seconds (or the node's own
+    "refresh_interval"), spread by +/- `jitter` so they don't all fire at
+    once. `parse(stream)` turns a fetched body (binary file) into proxy dicts, which are
+    kept per source; nodes() only reads that store and never does I/O
+    beyond loading a cached copy the first time.
+
+    Every source has a CircuitBreaker (built by `breaker()`). A failed
+    refresh (a body without nodes included) is retried after the breaker's base backoff rather than a full
+    interval; once it trips, the source is left alone until the backoff
+    runs out and keeps serving its last nodes meanwhile.
+    """
+
+    def __init__(self, cache, parse, config_store, is_direct, interval=600, workers=4, jitter=0.1,
+                 breaker=CircuitBreaker):
+        self.cache = cache
+        self.parse = parse
+        self.config_store = config_store
+        self.is_direct = is_direct
+        self.interval = interval
+        self.jitter = jitter
+        self.breaker = breaker
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upstream')
+        self._sources = {}
+        self._config_version = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sync_sources(self, snap):
+        """Track the upstream URLs of the current config; called under the lock."""
+        if snap.version == self._config_version:
+            return
+        wanted = {}
+        for n in snap.nodes:
+            url = n.get("url", "")
+            if not url or self.is_direct(url):
+                continue
+            interval = n.get("refresh_interval") or self.interval
+            wanted[url] = min(interval, wanted.get(url, interval))
+        for url in list(self._sources):
+            if url not in wanted:
+                del self._sources[url]
+                try:
+                    self._pool.submit(self.cache.forget, url)  # Waits on any fetch of url; not under our lock
+                except RuntimeError:
+                    pass  # Stopped
+        for url, interval in wanted.items():
+            state = self._sources.get(url)
+            if state is None:
+                self._sources[url] = SourceState(url, interval, self.breaker())
+            elif state.interval != interval:
+                state.interval = interval
+                state.next_due = min(state.next_due, time.time() + interval)
+        self._config_version = snap.version
+
+    def _due(self, now):
+        with self._lock:
+            self._sync_sources(self.config_store.snapshot())
+            due = [s for s in self._sources.values() if not s.running and s.next_due <= now]
+            for state in due:
+                state.running = True
+        return due
+
+    def _refresh(self, state):
+        started = time.time()
+        breaker = state.breaker
+        with self._lock:
+            allowed = breaker.allow(started)
+        if not allowed:
+            with self._lock:
+                state.next_due = breaker.retry_at
+                state.running = False
+            return
+        try:
+            result = self.cache.fetch(state.url)
+            nodes = result.nodes
+            if nodes is None:
+                with result.open() as f:
+                    nodes = tuple(self.parse(f))
+            error = result.error
+            if error is None and not nodes:
+                error = "no nodes in upstream body"
+        except Exception as e:
+            result, nodes, error = None, None, str(e)
+        finished = time.time()
+        with self._lock:
+            state.last_attempt = started
+            state.duration = finished - started
+            state.error = error
+            if result is not None:
+                state.source = result.source
+                state.fetched_at = result.fetched_at
+                if nodes and nodes != state.nodes:  # An empty body never wipes the last good nodes
+                    state.nodes = nodes
+                    state.version += 1
+            if error is None:
+                state.last_success = finished
+                breaker.record_success()
+                spread = random.uniform(-self.jitter, self.jitter) * state.interval
+                state.next_due = finished + state.interval + spread
+            else:
+                breaker.record_failure(finished)
+                state.next_due = breaker.retry_at or finished + min(state.interval, breaker.base_backoff)
+            state.running = False
+            tripped = breaker.state == 'open'
+        if error:
+            print(f"Upstream refresh {state.url}: {error}" + (f" (circuit open, retry in {breaker.backoff}s)" if tripped else ""))
+
+    def refresh_due(self, wait=False):
+        """Submit every source that is due; with wait=True block until they finish."""
+        futures = [self._pool.submit(self._refresh, state) for state in self._due(time.time())]
+        if wait:
+            for future in futures:
+                future.result()
+        return len(futures)
+
+    def nodes(self, url):
+        """(version, parsed nodes) last fetched for url; never touches the network."""
+        with self._lock:
+            self._sync_sources(self.config_store.snapshot())
+            state = self._sources.get(url)
+            if state is not None and (state.loaded or state.last_attempt):
+                return state.version, state.nodes
+        # Not refreshed yet (e.g. just added): parse the on-disk copy once, if there is one
+        cached = self.cache.cached(url)
+        nodes = ()
+        if cached is not None:
+            try:
+                with cached.open() as f:
+                    nodes = tuple(self.parse(f))
+            except Exception as e:
+                print(f"Error parsing cached upstream {url}: {e}")
+        with self._lock:
+            state = self._sources.get(url)
+            self._wake.set()
+            if state is None:
+                return 0, nodes
+            if not (state.loaded or state.last_attempt):
+                state.loaded = True
+                if nodes:
+                    state.nodes, state.version, state.source, state.fetched_at = nodes, 1, 'disk', cached.fetched_at
+            return state.version, state.nodes
+
+    def versions(self):
+        """url -> version of every configured source (0 until it has nodes)."""
+        with self._lock:
+            self._sync_sources(self.config_store.snapshot())
+            return {url: state.version for url, state in self._sources.items()}
+
+    def tracks(self, url):
+        """Is url one of the configured upstream sources?"""
+        with self._lock:
+            self._sync_sources(self.config_store.snapshot())
+            return url in self._sources
+
+    def status(self):
+        with self._lock:
+            self._sync_sources(self.config_store.snapshot())
+            return [state.status() for state in self._sources.values()]
+
+    def wake(self):
+        """Re-check the config and due sources now (e.g. after a node was added)."""
+        self._wake.set()
+
+    def start(self):
+        self.refresh_due(wait=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='upstream-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._pool.shutdown(wait=False)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(1)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"Upstream scheduler error: {e}")
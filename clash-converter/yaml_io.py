@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YAML 读写层
+有 libyaml 时用 C 实现的 CSafeLoader / CDumper，没有时自动回退到纯 Python，
+两种模式输出的 Clash 配置逐字节一致。
+"""
+
+import re
+import yaml
+
+try:
+    from yaml import CSafeLoader as FastLoader, CDumper as FastDumper
+    LIBYAML = True
+except ImportError:
+    FastLoader, FastDumper = yaml.SafeLoader, yaml.Dumper
+    LIBYAML = False
+
+# Clash 配置统一的输出格式
+DUMP_OPTIONS = dict(allow_unicode=True, default_flow_style=False, sort_keys=False)
+
+# libyaml 的 emitter 认为 4 字节 UTF-8 字符（emoji、国旗）不可打印，会加引号转义成 "\U0001F680"，
+# 纯 Python 版照原样输出。dump 前先把这些字符换成私用区占位符，dump 后再换回来。
+ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+# 会让字符串变成双引号或多行（控制字符、换行、BOM 等）的字符：两边双引号的转义和折行不一样，直接走纯 Python
+NEEDS_DOUBLE_QUOTES = re.compile('[^\x20-\x7E\xA0-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFE]|[\u2028\u2029\uFEFF]')
+PLACEHOLDERS = range(0xE000, 0xF900)
+
+
+def load(stream, fast=None):
+    """safe_load；fast=None 表示有 libyaml 就用"""
+    loader = FastLoader if (LIBYAML if fast is None else fast) else yaml.SafeLoader
+    return yaml.load(stream, Loader=loader)
+
+
+def _collect(obj, strings, seen):
+    """收集非 ASCII 字符串；有 C 版输出不一致的内容（双引号字符串、别的类型、共享引用会生成锚点）返回 False"""
+    if isinstance(obj, str):
+        if obj.isascii():
+            return obj.isprintable()
+        if NEEDS_DOUBLE_QUOTES.search(obj):
+            return False
+        strings.add(obj)
+        return True
+    if isinstance(obj, (dict, list)):
+        if id(obj) in seen:
+            return False
+        seen.add(id(obj))
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if not (_collect(k, strings, seen) and _collect(v, strings, seen)):
+                    return False
+                # 空字符串键 Python 写成 "? ''"；128 的简单键长度上限 libyaml 按字节、Python 按字符算
+                if isinstance(k, str) and (not k or len(k.encode('utf-8')) > 128):
+                    return False
+            return True
+        return all(_collect(v, strings, seen) for v in obj)
+    return obj is None or isinstance(obj, (bool, int, float))
+
+
+def _replace(obj, mapping):
+    if isinstance(obj, str):
+        return mapping.get(obj, obj)
+    if isinstance(obj, dict):
+        return {_replace(k, mapping): _replace(v, mapping) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_replace(v, mapping) for v in obj]
+    return obj
+
+
+def _fast_dump(data):
+    """CDumper 输出，与 yaml.dump 一致；做不到一致时返回 None"""
+    strings = set()
+    if not _collect(data, strings, set()):
+        return None
+    astral = set()
+    used = set()
+    for s in strings:
+        astral.update(ASTRAL.findall(s))
+        used.update(s)
+    restore = None
+    if astral:
+        free = (chr(c) for c in PLACEHOLDERS if chr(c) not in used)
+        to_placeholder = {}
+        for ch in astral:
+            placeholder = next(free, None)
+            if placeholder is None:
+                return None
+            to_placeholder[ord(ch)] = placeholder
+        restore = {ord(p): ch for ch, p in ((chr(k), v) for k, v in to_placeholder.items())}
+        mapping = {s: s.translate(to_placeholder) for s in strings if ASTRAL.search(s)}
+        data = _replace(data, mapping)
+    try:
+        text = yaml.dump(data, Dumper=FastDumper, **DUMP_OPTIONS)
+    except yaml.YAMLError:
+        return None
+    return text.translate(restore) if restore else text
+
+
+def dump(data, fast=None):
+    """把配置 dump 成 YAML 文本（等同 yaml.dump(data, **DUMP_OPTIONS)）"""
+    if LIBYAML if fast is None else fast:
+        text = _fast_dump(data)
+        if text is not None:
+            return text
+    return yaml.dump(data, **DUMP_OPTIONS)
+
+
+def iter_dump(data, stream_keys=(), fragment=None, fast=None):
+    """按顶层键分段 dump 一个映射，拼起来等于 dump(data)（列表里没有共享引用时逐字节一致）
+
+    stream_keys（普通键名）里的列表逐项 dump，不会一次生成整段文本；
+    其它键交给 fragment(key, value) 取缓存好的文本，默认现 dump。
+    """
+    for key, value in data.items():
+        if key in stream_keys and isinstance(value, list) and value:
+            yield key + ':\n'
+            for item in value:
+                yield dump([item], fast)
+        elif fragment is not None:
+            yield fragment(key, value)
+        else:
+            yield dump({key: value}, fast)
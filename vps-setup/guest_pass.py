@@ -17,6 +17,9 @@ def generate_random_string(length=12):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
 def get_public_ip():
+    # Sub Hub passes its cached address so we don't query ident.me per guest pass
+    if os.environ.get('SUB_HUB_PUBLIC_IP'):
+        return os.environ['SUB_HUB_PUBLIC_IP']
     import urllib.request
     try:
         return urllib.request.urlopen('http://v4.ident.me').read().decode('utf8')